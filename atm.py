@@ -1,17 +1,76 @@
 import json
 from datetime import datetime
+import hashlib
+import hmac
 import os
+from ledger import (
+    Ledger, AccountsProjection, ReviewQueue, AccountOpened, Deposited, Withdrawn,
+    PinChanged, LoggedIn, LoggedOut, BalanceChecked,
+    TransactionHeld, HoldApproved, HoldDeclined
+)
+from idempotency import IdempotencyTable
+from directory import AccountDirectory, is_valid_account_number
+from cache import AccountCache, CachedAccountsProjection
+from offline import OFFLINE_AUTHORIZATION_TTL, OFFLINE_CLOCK_SKEW
+
+HELD_FOR_REVIEW = "Held for review"
 
 class ATM:
-    def __init__(self):
+    def __init__(self, accounts_file="users.json", ledger_file=None, risk_checks=(), account_store=None,
+                 audit_log=None, terminal_key=None):
         self.current_account = None
         self.pin_attempts = 0
         self.max_pin_attempts = 3
-        self.accounts_file = "users.json"
+        # accounts_file=None keeps everything in memory (headless/CI runs)
+        self.accounts_file = accounts_file
+        # A disk-backed store (e.g. cache.ShelveStore) replaces users.json; only
+        # the working set of records is then kept in memory
+        self.account_store = account_store
         self.accounts = self._load_accounts()
+        
+        # Results of keyed operations, so client retries are answered without re-running them
+        self.idempotency = IdempotencyTable()
+        
+        # Transactions held by the risk checks, until approve_hold or decline_hold
+        self.review_queue = ReviewQueue()
+        
+        # Every change goes through the ledger; self.accounts is its projection
+        projection = (CachedAccountsProjection(self.accounts) if account_store is not None
+                      else AccountsProjection(self.accounts))
+        self.ledger = Ledger(ledger_file, [projection, self.idempotency, self.review_queue])
+        if ledger_file and self.ledger.recover():
+            self._save_accounts()
+        
+        # Sorted account number index for prefix/range lookups and number allocation
+        self.directory = AccountDirectory(self.accounts)
+        self.ledger.subscribe(self.directory.on_event)
+        
+        # Pluggable scorers run before deposits and withdrawals; risky ones are held.
+        # They subscribe after recovery, so their features start empty on every start
+        self.risk_checks = list(risk_checks)
+        for check in self.risk_checks:
+            self.ledger.subscribe(check.on_event)
+        
+        # Tamper-evident copy of every applied event (see audit.AuditLog)
+        self.audit_log = audit_log
+        if audit_log is not None:
+            audit_log.catch_up(self.ledger)
+            self.ledger.subscribe(audit_log.on_event)
+        
+        # Signs offline authorizations. It must outlive a restart, or the tokens of
+        # withdrawals already paid out offline stop verifying, so there is no random default
+        self.terminal_key = terminal_key or os.environ.get("ATM_TERMINAL_KEY", "").encode() or None
 
     def _load_accounts(self):
         """Load accounts from JSON file or create default if not exists"""
+        if self.account_store is not None:
+            accounts = AccountCache(self.account_store)
+            if not len(accounts):
+                accounts.update(self._create_default_accounts())
+                accounts.flush()
+            return accounts
+        if self.accounts_file is None:
+            return self._create_default_accounts()
         if os.path.exists(self.accounts_file):
             try:
                 with open(self.accounts_file, 'r') as f:
@@ -46,33 +105,60 @@ class ATM:
 
     def _save_accounts(self, accounts=None):
         """Save accounts to JSON file"""
+        if self.account_store is not None:
+            # Write-behind: the cache writes dirty records back in batches, which
+            # is only safe when the ledger log can replay the ones not yet written
+            if accounts is None:
+                if self.ledger.log_file:
+                    self.accounts.checkpoint()
+                else:
+                    self.accounts.flush()
+            return
+        if self.accounts_file is None:
+            return
         with open(self.accounts_file, 'w') as f:
             json.dump(accounts or self.accounts, f, indent=4)
 
+    def flush(self):
+        """Write any buffered account records to storage"""
+        if self.account_store is not None:
+            self.accounts.flush()
+        else:
+            self._save_accounts()
+
     def get_all_users(self):
         """Return all registered users"""
         return self.accounts
 
-    def register_user(self, full_account, name, pin, initial_deposit=0):
+    def register_user(self, full_account, name, pin, initial_deposit=0, idempotency_key=None):
         """Register a new user"""
+        if idempotency_key in self.idempotency:
+            return self.idempotency[idempotency_key]
+        
         if full_account in self.accounts:
-            return False, "Account already exists"
+            return self._remember(idempotency_key, (False, "Account already exists"))
+        
+        if not is_valid_account_number(full_account):
+            return self._remember(idempotency_key, (False, "Invalid account number"))
         
         if len(pin) != 4 or not pin.isdigit():
-            return False, "PIN must be 4 digits"
+            return self._remember(idempotency_key, (False, "PIN must be 4 digits"))
         
         if initial_deposit < 0:
-            return False, "Initial deposit cannot be negative"
+            return self._remember(idempotency_key, (False, "Initial deposit cannot be negative"))
         
-        self.accounts[full_account] = {
-            "pin": pin,
-            "balance": float(initial_deposit),
-            "name": name,
-            "transaction_history": [f"Account created with initial deposit: ${initial_deposit:.2f}"]
-        }
+        self.ledger.append(AccountOpened(
+            full_account, self._get_current_time(),
+            name=name, pin=pin, initial_deposit=float(initial_deposit),
+            **self._key_data(idempotency_key)
+        ))
         
         self._save_accounts()
-        return True, "Registration successful"
+        return self._remember(idempotency_key, (True, "Registration successful"))
+
+    def allocate_account_number(self, branch="1000"):
+        """Return a new, unused account number for a branch"""
+        return self.directory.allocate(branch)
 
     def login(self, full_account, pin):
         """Authenticate user with full account number and PIN"""
@@ -83,7 +169,7 @@ class ATM:
             if pin == self.accounts[full_account]["pin"]:
                 self.current_account = full_account
                 self.pin_attempts = 0
-                self._add_transaction("Login")
+                self._add_transaction(LoggedIn)
                 return True, "Login successful"
             else:
                 self.pin_attempts += 1
@@ -94,47 +180,208 @@ class ATM:
     def logout(self):
         """Logout the current user"""
         if self.current_account:
-            self._add_transaction("Logout")
+            self._add_transaction(LoggedOut)
         self.current_account = None
         return True
 
+    def expire_session(self, full_account):
+        """Logout an account whose session timed out"""
+        if full_account in self.accounts:
+            self.ledger.append(LoggedOut(full_account, self._get_current_time()))
+        if self.current_account == full_account:
+            self.current_account = None
+            self.pin_attempts = 0
+        return True
+
+    def get_balance(self):
+        """Return current balance without recording a balance check"""
+        if self.current_account:
+            return self.accounts[self.current_account]["balance"]
+        return None
+
     def check_balance(self):
         """Return current balance"""
         if self.current_account:
             balance = self.accounts[self.current_account]["balance"]
-            self._add_transaction("Balance Check")
+            self._add_transaction(BalanceChecked)
             return balance
         return None
 
-    def deposit(self, amount):
+    def deposit(self, amount, idempotency_key=None):
         """Deposit money into account"""
-        if self.current_account and amount > 0:
-            self.accounts[self.current_account]["balance"] += amount
-            self._add_transaction(f"Deposit: ${amount:.2f}")
-            self._save_accounts()
-            return True
-        return False
+        if idempotency_key in self.idempotency:
+            return self.idempotency[idempotency_key]
+        if not self.current_account:
+            return self._remember(idempotency_key, (False, "Not logged in"))
+        if amount <= 0:
+            return self._remember(idempotency_key, (False, "Invalid deposit amount"))
+        if self._held_for_review(self.current_account, "deposit", amount, idempotency_key):
+            return self._remember(idempotency_key, (False, HELD_FOR_REVIEW))
+        self._add_transaction(Deposited, amount=amount, **self._key_data(idempotency_key))
+        self._save_accounts()
+        return self._remember(idempotency_key, (True, "Deposit successful"))
 
-    def withdraw(self, amount):
+    def withdraw(self, amount, idempotency_key=None):
         """Withdraw money from account"""
-        if (self.current_account and amount > 0 and 
-            amount <= self.accounts[self.current_account]["balance"]):
-            self.accounts[self.current_account]["balance"] -= amount
-            self._add_transaction(f"Withdrawal: ${amount:.2f}")
-            self._save_accounts()
-            return True
-        return False
+        if idempotency_key in self.idempotency:
+            return self.idempotency[idempotency_key]
+        if not self.current_account:
+            return self._remember(idempotency_key, (False, "Not logged in"))
+        if amount <= 0:
+            return self._remember(idempotency_key, (False, "Invalid withdrawal amount"))
+        if amount > self.accounts[self.current_account]["balance"]:
+            return self._remember(idempotency_key, (False, "Insufficient funds"))
+        if self._held_for_review(self.current_account, "withdraw", amount, idempotency_key):
+            return self._remember(idempotency_key, (False, HELD_FOR_REVIEW))
+        self._add_transaction(Withdrawn, amount=amount, **self._key_data(idempotency_key))
+        self._save_accounts()
+        return self._remember(idempotency_key, (True, "Withdrawal successful"))
+
+    def approve_hold(self, hold):
+        """Back office: post a held transaction (a withdrawal is paid out at the branch,
+        unless the terminal already paid it out offline)"""
+        held = self.review_queue.get(hold)
+        if held is None:
+            return False, "No such hold"
+        if (held["kind"] == "withdraw" and not held["offline"] and
+                held["amount"] > self.accounts[held["account"]]["balance"]):
+            return False, "Insufficient funds"
+        event_type = Withdrawn if held["kind"] == "withdraw" else Deposited
+        now = self._get_current_time()
+        self.ledger.append_many([
+            HoldApproved(held["account"], now, hold=hold),
+            event_type(held["account"], now, amount=held["amount"], hold=hold)
+        ])
+        self._save_accounts()
+        return True, "Hold approved"
+
+    def decline_hold(self, hold):
+        """Back office: refuse a held transaction for good"""
+        held = self.review_queue.get(hold)
+        if held is None:
+            return False, "No such hold"
+        self.ledger.append(HoldDeclined(held["account"], self._get_current_time(), hold=hold))
+        self._save_accounts()
+        return True, "Hold declined"
 
-    def change_pin(self, old_pin, new_pin):
+    def change_pin(self, old_pin, new_pin, idempotency_key=None):
         """Change PIN if old PIN is correct"""
-        if (self.current_account and 
-            old_pin == self.accounts[self.current_account]["pin"] and 
-            len(new_pin) == 4 and new_pin.isdigit()):
-            self.accounts[self.current_account]["pin"] = new_pin
-            self._add_transaction("PIN Changed")
+        if idempotency_key in self.idempotency:
+            return self.idempotency[idempotency_key]
+        if not self.current_account:
+            return self._remember(idempotency_key, (False, "Not logged in"))
+        if old_pin != self.accounts[self.current_account]["pin"]:
+            return self._remember(idempotency_key, (False, "Invalid current PIN"))
+        if len(new_pin) != 4 or not new_pin.isdigit():
+            return self._remember(idempotency_key, (False, "New PIN must be 4 digits"))
+        self._add_transaction(PinChanged, pin=new_pin, **self._key_data(idempotency_key))
+        self._save_accounts()
+        return self._remember(idempotency_key, (True, "PIN changed successfully"))
+
+    def authorize_terminal(self, full_account, pin):
+        """Check a PIN for a terminal and return a token it attaches to the account's transactions"""
+        self._require_terminal_key()
+        record = self.accounts.get(full_account)
+        if record is None or record["pin"] != pin:
+            return None
+        issued_at = self._get_current_time()
+        return f"{issued_at}|{self._sign_authorization(full_account, issued_at)}"
+
+    def _require_terminal_key(self):
+        if not self.terminal_key:
+            raise ValueError("A terminal signing key is required: pass terminal_key= or set ATM_TERMINAL_KEY")
+
+    def _sign_authorization(self, full_account, issued_at):
+        message = f"{full_account}|{issued_at}".encode()
+        return hmac.new(self.terminal_key, message, hashlib.sha256).hexdigest()
+
+    def _is_authorized(self, txn):
+        """Check that a terminal transaction carries a valid token for its account"""
+        issued_at, _, signature = str(txn.get("authorization", "")).partition("|")
+        if not signature or not hmac.compare_digest(
+                signature, self._sign_authorization(txn["account"], issued_at)):
+            return False
+        try:
+            age = (datetime.strptime(txn["queued_at"], "%Y-%m-%d %H:%M:%S") -
+                   datetime.strptime(issued_at, "%Y-%m-%d %H:%M:%S"))
+        except ValueError:
+            return False
+        # Terminal clocks may run a little behind the core's
+        return -OFFLINE_CLOCK_SKEW <= age <= OFFLINE_AUTHORIZATION_TTL
+
+    def post_offline_transactions(self, transactions):
+        """Post a batch of terminal transactions with a single save.
+
+        Each transaction must carry a token from authorize_terminal. Withdrawals
+        marked "offline" were paid out while the core was unreachable; the rest
+        are checked against the balance and the risk checks like an ordinary
+        transaction. Offline transactions are not scored, and one whose token
+        does not verify is held for the back office rather than rejected: cash
+        has already changed hands, so it must not be dropped.
+        """
+        self._require_terminal_key()
+        results = []
+        for txn in transactions:
+            key = txn["key"]
+            if key in self.idempotency:
+                results.append((key, "duplicate"))
+                continue
+
+            record = self.accounts.get(txn["account"])
+            if record is None or txn["amount"] <= 0:
+                results.append((key, self._remember(key, "rejected")))
+                continue
+            if not self._is_authorized(txn):
+                if not txn.get("offline"):
+                    results.append((key, self._remember(key, "rejected")))
+                    continue
+                self.ledger.append(TransactionHeld(
+                    txn["account"], txn["queued_at"], kind=txn["kind"], amount=txn["amount"],
+                    score=None, offline=True, idempotency_key=key
+                ))
+                results.append((key, self._remember(key, "held")))
+                continue
+
+            if txn["kind"] == "withdraw":
+                overdraws = txn["amount"] > record["balance"]
+                if overdraws and not txn.get("offline"):
+                    results.append((key, self._remember(key, "insufficient_funds")))
+                    continue
+                # Cash paid out offline has already changed hands, so it is posted
+                # even when it overdraws the account and reported as a conflict
+                status = "overdrawn" if overdraws else "posted"
+                event_type = Withdrawn
+            else:
+                status = "posted"
+                event_type = Deposited
+            if not txn.get("offline") and self._held_for_review(
+                    txn["account"], txn["kind"], txn["amount"], key):
+                results.append((key, self._remember(key, "held")))
+                continue
+            self.ledger.append(event_type(
+                txn["account"], txn["queued_at"],
+                amount=txn["amount"], idempotency_key=key
+            ))
+            results.append((key, self._remember(key, status)))
+
+        self._save_accounts()
+        return results
+
+    def commit_batch(self, events, idempotency_key=None):
+        """Apply a batch of back-office events (interest, fees) with a single save.
+
+        These are generated by the bank rather than requested by a customer,
+        so they are not risk scored.
+        """
+        if idempotency_key in self.idempotency:
+            return 0
+        if events:
+            # The key travels on the first event so a replay rebuilds it as well
+            events[0].data.update(self._key_data(idempotency_key))
+            self.ledger.append_many(events)
             self._save_accounts()
-            return True
-        return False
+        self._remember(idempotency_key, True)
+        return len(events)
 
     def get_transaction_history(self):
         """Get last 5 transactions"""
@@ -148,13 +395,37 @@ class ATM:
             return self.accounts[self.current_account]["name"]
         return ""
 
-    def _add_transaction(self, transaction_type):
-        """Add transaction to history"""
+    def _add_transaction(self, event_type, **data):
+        """Record a transaction event for the current account in the ledger"""
         if self.current_account:
-            self.accounts[self.current_account]["transaction_history"].append(
-                f"{transaction_type} at {self._get_current_time()}"
+            return self.ledger.append(
+                event_type(self.current_account, self._get_current_time(), **data)
             )
 
+    def _held_for_review(self, full_account, kind, amount, idempotency_key=None):
+        """Score a transaction and record a hold if any check is over threshold"""
+        for check in self.risk_checks:
+            score = check.score(full_account, kind, amount)
+            if score >= check.threshold:
+                self.ledger.append(TransactionHeld(
+                    full_account, self._get_current_time(),
+                    kind=kind, amount=float(amount), score=score,
+                    **self._key_data(idempotency_key)
+                ))
+                self._save_accounts()
+                return True
+        return False
+
+    def _remember(self, idempotency_key, result):
+        """Cache an operation result for retries with the same idempotency key"""
+        if idempotency_key is not None:
+            self.idempotency.put(idempotency_key, result)
+        return result
+
+    def _key_data(self, idempotency_key):
+        """Event data recording the idempotency key, if one was given"""
+        return {} if idempotency_key is None else {"idempotency_key": idempotency_key}
+
     def _get_current_time(self):
         """Helper to get current time string"""
         return datetime.now().strftime("%Y-%m-%d %H:%M:%S")
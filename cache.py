@@ -0,0 +1,274 @@
+from collections import OrderedDict
+from collections.abc import MutableMapping
+import os
+import random
+import shelve
+import time
+
+from ledger import AccountsProjection
+
+# Rough in-memory size of an account record and of each history line, in bytes
+RECORD_OVERHEAD = 600
+HISTORY_ENTRY_SIZE = 110
+
+
+def estimate_size(record):
+    """Cheap O(1) estimate of how much memory a cached account record uses"""
+    return RECORD_OVERHEAD + HISTORY_ENTRY_SIZE * len(record["transaction_history"])
+
+
+class ShelveStore:
+    """Disk-backed account store built on the standard library shelve module"""
+    # Kept next to the records; account numbers are all digits, so it cannot clash
+    SEQ_KEY = "applied_seq"
+
+    def __init__(self, path):
+        self.path = path
+        self._db = shelve.open(path)
+
+    @property
+    def seq(self):
+        """Ledger sequence number the stored records are up to date with"""
+        return self._db.get(self.SEQ_KEY, 0)
+
+    @seq.setter
+    def seq(self, value):
+        self._db[self.SEQ_KEY] = value
+
+    def get(self, full_account):
+        return self._db.get(full_account)
+
+    def put(self, full_account, record):
+        self._db[full_account] = record
+
+    def delete(self, full_account):
+        self._db.pop(full_account, None)
+
+    def __contains__(self, full_account):
+        return full_account != self.SEQ_KEY and full_account in self._db
+
+    def keys(self):
+        return [key for key in self._db.keys() if key != self.SEQ_KEY]
+
+    def clear(self):
+        """Remove every record by recreating the file"""
+        self._db.close()
+        self._db = shelve.open(self.path, flag='n')
+
+    def sync(self):
+        self._db.sync()
+
+    def close(self):
+        self._db.close()
+
+
+class AccountCache(MutableMapping):
+    """Bounded read-through, write-behind LRU cache of account records.
+
+    Reads load missing records from the store. Writes only mark the record
+    dirty; dirty records are written back when evicted, when more than
+    max_dirty accumulate, or on flush(). Behaves like the accounts dict, so
+    it can stand in for ATM.accounts.
+    """
+
+    def __init__(self, store, max_bytes=16 * 1024 * 1024, max_dirty=100, size_of=estimate_size):
+        self.store = store
+        self.max_bytes = max_bytes
+        self.max_dirty = max_dirty
+        self.size_of = size_of
+        self._records = OrderedDict()
+        self._sizes = {}
+        self._dirty = set()
+        # Ledger seq of the newest event applied to the cached records
+        self.seq = store.seq
+        self.used_bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.writes = 0
+
+    def __getitem__(self, full_account):
+        record = self._records.get(full_account)
+        if record is not None:
+            self._records.move_to_end(full_account)
+            self.hits += 1
+            return record
+        self.misses += 1
+        record = self.store.get(full_account)
+        if record is None:
+            raise KeyError(full_account)
+        self._insert(full_account, record)
+        return record
+
+    def __setitem__(self, full_account, record):
+        self._insert(full_account, record)
+        self._dirty.add(full_account)
+
+    def __delitem__(self, full_account):
+        if full_account not in self:
+            raise KeyError(full_account)
+        if full_account in self._records:
+            del self._records[full_account]
+            self.used_bytes -= self._sizes.pop(full_account)
+        self._dirty.discard(full_account)
+        self.store.delete(full_account)
+
+    def __contains__(self, full_account):
+        return full_account in self._records or full_account in self.store
+
+    def __iter__(self):
+        self.flush()
+        return iter(list(self.store.keys()))
+
+    def __len__(self):
+        self.flush()
+        return len(self.store.keys())
+
+    def _insert(self, full_account, record):
+        """Add or refresh a record, then evict least recently used ones over budget"""
+        size = self.size_of(record)
+        self.used_bytes += size - self._sizes.get(full_account, 0)
+        self._sizes[full_account] = size
+        self._records[full_account] = record
+        self._records.move_to_end(full_account)
+
+        while self.used_bytes > self.max_bytes and len(self._records) > 1:
+            evicted, evicted_record = self._records.popitem(last=False)
+            self.used_bytes -= self._sizes.pop(evicted)
+            if evicted in self._dirty:
+                # Write every dirty record with it, so the store stays at one seq
+                self._write(evicted, evicted_record)
+                self.flush()
+            self.evictions += 1
+
+    def _write(self, full_account, record):
+        self.store.put(full_account, record)
+        self._dirty.discard(full_account)
+        self.writes += 1
+
+    def checkpoint(self):
+        """Write-behind point: flush once enough dirty records have built up"""
+        if len(self._dirty) >= self.max_dirty:
+            self.flush()
+
+    def flush(self):
+        """Write every dirty record back to the store"""
+        for full_account in list(self._dirty):
+            self._write(full_account, self._records[full_account])
+        self.store.seq = self.seq
+        self.store.sync()
+
+    def clear(self):
+        """Drop every record, cached and stored, in one step"""
+        self._records.clear()
+        self._sizes.clear()
+        self._dirty.clear()
+        self.used_bytes = 0
+        self.store.clear()
+        self.seq = 0
+
+    def load(self, records, seq):
+        """Replace the store's contents with records as of a ledger seq"""
+        self.clear()
+        for full_account, record in records.items():
+            self.store.put(full_account, record)
+        self.seq = seq
+        self.store.seq = seq
+        self.store.sync()
+
+    def hit_rate(self):
+        lookups = self.hits + self.misses
+        return self.hits / lookups if lookups else 0.0
+
+    def stats(self):
+        """Return hit/miss/eviction counters and memory use"""
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hit_rate(),
+            "evictions": self.evictions,
+            "writes": self.writes,
+            "cached": len(self._records),
+            "dirty": len(self._dirty),
+            "used_bytes": self.used_bytes,
+            "max_bytes": self.max_bytes
+        }
+
+
+class CachedAccountsProjection(AccountsProjection):
+    """AccountsProjection over an AccountCache whose store is its own checkpoint.
+
+    Snapshots flush the cache and record the store's seq instead of copying
+    every record, and replays skip events the store already has. Such a
+    snapshot is useless to another process, so only the genesis checkpoint
+    holds the records.
+    """
+    portable = False
+
+    def __init__(self, accounts):
+        super().__init__(accounts)
+        self.store_seq = accounts.store.seq
+
+    def apply(self, event):
+        if event.seq and event.seq <= self.store_seq:
+            return
+        self.accounts.seq = event.seq
+        super().apply(event)
+
+    def reset(self):
+        # A store that has applied this ledger is kept; the replay skips what it holds
+        if not self.accounts.store.seq:
+            self.accounts.clear()
+        self.store_seq = self.accounts.store.seq
+
+    def snapshot(self):
+        self.accounts.flush()
+        return {"store_seq": self.accounts.seq}
+
+    def genesis(self):
+        return dict(self.accounts.items())
+
+    def restore(self, state):
+        if set(state) != {"store_seq"}:
+            # Snapshot of plain records, written before the store kept its seq
+            self.accounts.load(state, 0)
+            self.store_seq = 0
+            return
+        if self.accounts.store.seq < state["store_seq"]:
+            raise ValueError("Account store is older than the ledger snapshot")
+        self.store_seq = self.accounts.store.seq
+
+
+def benchmark(workdir, accounts=20000, hot=50, reads=200000):
+    """Read a small hot set out of a large store through a small cache"""
+    store = ShelveStore(os.path.join(workdir, "accounts"))
+    for i in range(accounts):
+        store.put(f"{4000000000 + i}", {
+            "pin": "0000", "balance": 100.0, "name": f"Customer {i}",
+            "transaction_history": ["Login at 2025-01-01 00:00:00"] * 20
+        })
+    store.sync()
+
+    cache = AccountCache(store, max_bytes=256 * 1024)
+    hot_set = [f"{4000000000 + i}" for i in random.sample(range(accounts), hot)]
+    start = time.perf_counter()
+    for i in range(reads):
+        # 99% of reads hit logged-in accounts, 1% are cold lookups
+        if i % 100:
+            full_account = hot_set[i % hot]
+        else:
+            full_account = f"{4000000000 + random.randrange(accounts)}"
+        cache[full_account]["balance"]
+    elapsed = time.perf_counter() - start
+    stats = cache.stats()
+    store.close()
+    return elapsed / reads, stats
+
+
+if __name__ == "__main__":
+    import tempfile
+    with tempfile.TemporaryDirectory() as workdir:
+        per_read, stats = benchmark(workdir)
+        print(f"{per_read * 1e6:.2f} us per read, hit rate {stats['hit_rate']:.1%}, "
+              f"{stats['cached']} records cached in {stats['used_bytes'] / 1024:.0f} KiB "
+              f"of {stats['max_bytes'] / 1024:.0f} KiB")
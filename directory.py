@@ -0,0 +1,135 @@
+from bisect import bisect_left, bisect_right, insort
+import random
+import time
+
+# Account numbers are a 4-digit branch code, a serial number and a Luhn check digit
+BRANCH_LENGTH = 4
+ACCOUNT_NUMBER_LENGTH = 10
+MIN_ACCOUNT_NUMBER_LENGTH = 8
+MAX_ACCOUNT_NUMBER_LENGTH = 16
+
+
+def luhn_check_digit(digits):
+    """Return the Luhn check digit for a string of digits"""
+    total = 0
+    # Double every second digit counting from the right, where the check digit will go
+    for i, digit in enumerate(reversed(digits)):
+        n = int(digit)
+        if i % 2 == 0:
+            n *= 2
+            if n > 9:
+                n -= 9
+        total += n
+    return str((10 - total % 10) % 10)
+
+
+def is_valid_account_number(full_account):
+    """Check the length, digits and Luhn check digit of an account number"""
+    return (isinstance(full_account, str) and full_account.isdigit() and
+            MIN_ACCOUNT_NUMBER_LENGTH <= len(full_account) <= MAX_ACCOUNT_NUMBER_LENGTH and
+            luhn_check_digit(full_account[:-1]) == full_account[-1])
+
+
+class AccountDirectory:
+    """Sorted index of account numbers for lookups, prefix and range queries.
+
+    Numbers are kept as strings in lexicographic order, so a branch prefix is a
+    contiguous slice found with two binary searches. Range queries compare as
+    strings, which matches numeric order for numbers of the same length.
+    """
+
+    def __init__(self, account_numbers=()):
+        self._numbers = sorted(account_numbers)
+        # Next serial to try per branch, so allocation does not rescan issued numbers
+        self._next_serial = {}
+
+    def __len__(self):
+        return len(self._numbers)
+
+    def __contains__(self, full_account):
+        i = bisect_left(self._numbers, full_account)
+        return i < len(self._numbers) and self._numbers[i] == full_account
+
+    def add(self, full_account):
+        """Index a new account number"""
+        if full_account not in self:
+            insort(self._numbers, full_account)
+
+    def prefix_search(self, prefix, limit=None):
+        """Return account numbers starting with prefix, in order"""
+        start = bisect_left(self._numbers, prefix)
+        # Every string with this prefix sorts before prefix + the highest character
+        end = bisect_left(self._numbers, prefix + "\uffff", start)
+        if limit is not None:
+            end = min(end, start + limit)
+        return self._numbers[start:end]
+
+    def range_search(self, low, high, limit=None):
+        """Return account numbers n with low <= n <= high, in order"""
+        start = bisect_left(self._numbers, low)
+        end = bisect_right(self._numbers, high, start)
+        if limit is not None:
+            end = min(end, start + limit)
+        return self._numbers[start:end]
+
+    def allocate(self, branch):
+        """Return an unused, checksummed account number for a branch"""
+        if len(branch) != BRANCH_LENGTH or not branch.isdigit():
+            raise ValueError(f"Branch must be {BRANCH_LENGTH} digits")
+        serial_length = ACCOUNT_NUMBER_LENGTH - BRANCH_LENGTH - 1
+        serial = self._next_serial.get(branch)
+        if serial is None:
+            # Continue after the highest number already issued for the branch
+            end = bisect_left(self._numbers, branch + "\uffff")
+            last = self._numbers[end - 1] if end else ""
+            if last.startswith(branch) and len(last) == ACCOUNT_NUMBER_LENGTH:
+                serial = int(last[BRANCH_LENGTH:-1]) + 1
+            else:
+                serial = 1
+        while serial < 10 ** serial_length:
+            body = f"{branch}{serial:0{serial_length}d}"
+            full_account = body + luhn_check_digit(body)
+            serial += 1
+            if full_account not in self:
+                self._next_serial[branch] = serial
+                return full_account
+        raise ValueError(f"Branch {branch} has no account numbers left")
+
+    def on_event(self, event):
+        """Ledger subscriber: index newly opened accounts"""
+        if event.type == "AccountOpened":
+            self.add(event.account)
+
+
+def benchmark(accounts=1000000, lookups=10000):
+    """Time lookups and branch prefix scans over a large directory"""
+    start = time.perf_counter()
+    numbers = []
+    for i in range(accounts):
+        body = f"{1000 + i % 50:04d}{i // 50:05d}"
+        numbers.append(body + luhn_check_digit(body))
+    directory = AccountDirectory(numbers)
+    build = time.perf_counter() - start
+
+    sample = random.sample(numbers, lookups)
+    start = time.perf_counter()
+    for full_account in sample:
+        full_account in directory
+    lookup = (time.perf_counter() - start) / lookups
+
+    start = time.perf_counter()
+    for full_account in sample:
+        directory.prefix_search(full_account[:7], limit=20)
+    prefix = (time.perf_counter() - start) / lookups
+
+    start = time.perf_counter()
+    new_number = directory.allocate("1000")
+    allocate = time.perf_counter() - start
+    return build, lookup, prefix, allocate, new_number
+
+
+if __name__ == "__main__":
+    build, lookup, prefix, allocate, new_number = benchmark()
+    print(f"Indexed 1,000,000 accounts in {build:.2f} s; "
+          f"lookup {lookup * 1e6:.2f} us, prefix scan {prefix * 1e6:.2f} us, "
+          f"allocated {new_number} in {allocate * 1e6:.1f} us")
@@ -0,0 +1,73 @@
+from collections import OrderedDict
+import time
+
+from ledger import Projection, AccountOpened, Deposited, Withdrawn, PinChanged, TransactionHeld
+
+# Results of the customer operations that record their key on an event
+EVENT_RESULTS = {
+    AccountOpened: (True, "Registration successful"),
+    Deposited: (True, "Deposit successful"),
+    Withdrawn: (True, "Withdrawal successful"),
+    PinChanged: (True, "PIN changed successfully"),
+    TransactionHeld: (False, "Held for review")
+}
+
+
+class IdempotencyTable(Projection):
+    """Bounded table of operation results keyed by client idempotency keys.
+
+    Entries expire after ttl seconds and the least recently used entry is
+    evicted once max_entries is reached. As a ledger projection the table is
+    saved in snapshots and rebuilt from keyed events on replay.
+    """
+
+    def __init__(self, max_entries=10000, ttl=24 * 60 * 60):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._entries = OrderedDict()
+
+    def __contains__(self, key):
+        entry = self._entries.get(key)
+        if entry is None:
+            return False
+        if entry[1] <= time.time():
+            del self._entries[key]
+            return False
+        return True
+
+    def __getitem__(self, key):
+        self._entries.move_to_end(key)
+        return self._entries[key][0]
+
+    def __len__(self):
+        return len(self._entries)
+
+    def put(self, key, result, expires_at=None):
+        """Remember the result of the operation identified by key"""
+        if expires_at is None:
+            expires_at = time.time() + self.ttl
+        self._entries[key] = (result, expires_at)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def apply(self, event):
+        key = event.data.get("idempotency_key")
+        if key is None:
+            return
+        self.put(key, EVENT_RESULTS.get(type(event), True))
+
+    def reset(self):
+        self._entries.clear()
+
+    def snapshot(self):
+        now = time.time()
+        return [[key, result, expires_at]
+                for key, (result, expires_at) in self._entries.items()
+                if expires_at > now]
+
+    def restore(self, state):
+        self._entries.clear()
+        for key, result, expires_at in state:
+            # JSON turns (success, message) tuples into lists
+            self.put(key, tuple(result) if isinstance(result, list) else result, expires_at)
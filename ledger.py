@@ -0,0 +1,382 @@
+import json
+import os
+
+
+class Event:
+    """A single change to an account, recorded in the ledger"""
+    type = "Event"
+
+    def __init__(self, account, timestamp, **data):
+        self.account = account
+        self.timestamp = timestamp
+        self.data = data
+        self.seq = None
+
+    def describe(self):
+        """Return the transaction history line for this event"""
+        return f"{self.type} at {self.timestamp}"
+
+    def to_dict(self):
+        """Convert the event to a JSON-serialisable record"""
+        return {
+            "seq": self.seq,
+            "type": self.type,
+            "account": self.account,
+            "timestamp": self.timestamp,
+            "data": self.data
+        }
+
+    @staticmethod
+    def from_dict(record):
+        """Rebuild an event from a record written by to_dict"""
+        event = EVENT_TYPES[record["type"]](record["account"], record["timestamp"], **record["data"])
+        event.seq = record["seq"]
+        return event
+
+
+class AccountOpened(Event):
+    type = "AccountOpened"
+
+    def describe(self):
+        return f"Account created with initial deposit: ${self.data['initial_deposit']:.2f}"
+
+
+class Deposited(Event):
+    type = "Deposited"
+
+    def describe(self):
+        return f"Deposit: ${self.data['amount']:.2f} at {self.timestamp}"
+
+
+class Withdrawn(Event):
+    type = "Withdrawn"
+
+    def describe(self):
+        return f"Withdrawal: ${self.data['amount']:.2f} at {self.timestamp}"
+
+
+class PinChanged(Event):
+    type = "PinChanged"
+
+    def describe(self):
+        return f"PIN Changed at {self.timestamp}"
+
+
+class LoggedIn(Event):
+    type = "LoggedIn"
+
+    def describe(self):
+        return f"Login at {self.timestamp}"
+
+
+class LoggedOut(Event):
+    type = "LoggedOut"
+
+    def describe(self):
+        return f"Logout at {self.timestamp}"
+
+
+class BalanceChecked(Event):
+    type = "BalanceChecked"
+
+    def describe(self):
+        return f"Balance Check at {self.timestamp}"
+
+
+class InterestAccrued(Event):
+    type = "InterestAccrued"
+
+    def describe(self):
+        return f"Interest: ${self.data['amount']:.2f} at {self.timestamp}"
+
+
+class FeeCharged(Event):
+    type = "FeeCharged"
+
+    def describe(self):
+        return f"{self.data['description']}: ${self.data['amount']:.2f} at {self.timestamp}"
+
+
+class TransactionHeld(Event):
+    type = "TransactionHeld"
+
+    def describe(self):
+        return f"Held for review ({self.data['kind']}): ${self.data['amount']:.2f} at {self.timestamp}"
+
+
+class HoldApproved(Event):
+    type = "HoldApproved"
+
+    def describe(self):
+        return f"Hold approved at {self.timestamp}"
+
+
+class HoldDeclined(Event):
+    type = "HoldDeclined"
+
+    def describe(self):
+        return f"Hold declined at {self.timestamp}"
+
+
+EVENT_TYPES = {
+    cls.type: cls for cls in (
+        AccountOpened, Deposited, Withdrawn, PinChanged,
+        LoggedIn, LoggedOut, BalanceChecked, InterestAccrued, FeeCharged,
+        TransactionHeld, HoldApproved, HoldDeclined
+    )
+}
+
+
+class Projection:
+    """A read model kept up to date by applying ledger events in order"""
+    # Whether snapshot() holds the whole state, so another process can restore it
+    portable = True
+
+    def apply(self, event):
+        raise NotImplementedError
+
+    def reset(self):
+        """Clear the projection before a replay from genesis"""
+        raise NotImplementedError
+
+    def snapshot(self):
+        """Return the projection state as JSON-serialisable data"""
+        raise NotImplementedError
+
+    def restore(self, state):
+        """Load state previously returned by snapshot"""
+        raise NotImplementedError
+
+    def genesis(self):
+        """Return the full state to record before the first event, for the genesis checkpoint"""
+        return self.snapshot()
+
+
+class AccountsProjection(Projection):
+    """Account records in the users.json layout (pin, balance, name, history)"""
+
+    def __init__(self, accounts=None):
+        # Updated in place so callers holding the dict always see the latest state
+        self.accounts = accounts if accounts is not None else {}
+
+    def apply(self, event):
+        if isinstance(event, AccountOpened):
+            self.accounts[event.account] = {
+                "pin": event.data["pin"],
+                "balance": float(event.data["initial_deposit"]),
+                "name": event.data["name"],
+                "transaction_history": [event.describe()]
+            }
+            return
+
+        record = self.accounts[event.account]
+        if isinstance(event, (Deposited, InterestAccrued)):
+            record["balance"] += event.data["amount"]
+        elif isinstance(event, (Withdrawn, FeeCharged)):
+            record["balance"] -= event.data["amount"]
+        elif isinstance(event, PinChanged):
+            record["pin"] = event.data["pin"]
+        if isinstance(event, InterestAccrued):
+            # Sub-cent interest not credited yet; the next accrual adds it back
+            record["interest_carry"] = event.data.get("carry", 0.0)
+            if not event.data["amount"]:
+                # Nothing credited, so nothing for the customer's history
+                self.accounts[event.account] = record
+                return
+        record["transaction_history"].append(event.describe())
+        # Reassign so cache-backed mappings see the record as dirty
+        self.accounts[event.account] = record
+
+    def reset(self):
+        self.accounts.clear()
+
+    def snapshot(self):
+        return dict(self.accounts)
+
+    def restore(self, state):
+        self.accounts.clear()
+        self.accounts.update(state)
+
+
+class ReviewQueue(Projection):
+    """Held transactions still waiting for a decision: those over a risk threshold,
+    and offline payouts whose authorization did not verify"""
+
+    def __init__(self):
+        # Keyed by the seq of the TransactionHeld event, which is the hold's id
+        self.holds = {}
+
+    def apply(self, event):
+        if isinstance(event, TransactionHeld):
+            self.holds[event.seq] = {
+                "hold": event.seq,
+                "account": event.account,
+                "kind": event.data["kind"],
+                "amount": event.data["amount"],
+                "score": event.data["score"],
+                "offline": event.data.get("offline", False),
+                "time": event.timestamp
+            }
+        elif isinstance(event, (HoldApproved, HoldDeclined)):
+            self.holds.pop(event.data["hold"], None)
+
+    def reset(self):
+        self.holds.clear()
+
+    def snapshot(self):
+        return list(self.holds.values())
+
+    def restore(self, state):
+        self.holds = {hold["hold"]: hold for hold in state}
+
+    def get(self, hold):
+        return self.holds.get(hold)
+
+    def __iter__(self):
+        return iter(list(self.holds.values()))
+
+    def __len__(self):
+        return len(self.holds)
+
+
+class Ledger:
+    """Append-only event log; the only write path for account state"""
+
+    def __init__(self, log_file=None, projections=(), snapshot_file=None, snapshot_interval=1000):
+        # log_file=None keeps events in memory only; projections still update
+        self.log_file = log_file
+        self.snapshot_file = snapshot_file or (log_file + ".snapshot" if log_file else None)
+        # State before the first event, kept for good (snapshots replace each other)
+        self.genesis_file = log_file + ".genesis" if log_file else None
+        self.snapshot_interval = snapshot_interval
+        self.projections = list(projections)
+        self.subscribers = []
+        self.seq = 0
+        self.snapshot_seq = 0
+
+    def subscribe(self, callback):
+        """Call callback(event) after every appended event"""
+        self.subscribers.append(callback)
+
+    def append(self, event):
+        """Persist an event, update projections and notify subscribers"""
+        self.append_many([event])
+        return event
+
+    def append_many(self, events):
+        """Persist a batch of events with a single log write, then apply them in order"""
+        for event in events:
+            self.seq += 1
+            event.seq = self.seq
+        if self.log_file and events:
+            with open(self.log_file, 'a') as f:
+                f.write("".join(json.dumps(event.to_dict()) + "\n" for event in events))
+
+        for event in events:
+            for projection in self.projections:
+                projection.apply(event)
+            for callback in self.subscribers:
+                callback(event)
+
+        if self.snapshot_file and self.seq - self.snapshot_seq >= self.snapshot_interval:
+            self.snapshot()
+        return events
+
+    def events(self, after_seq=0):
+        """Stream logged events with a sequence number above after_seq"""
+        if not self.log_file or not os.path.exists(self.log_file):
+            return
+        with open(self.log_file, 'r') as f:
+            for line in f:
+                if not line.strip():
+                    continue
+                record = json.loads(line)
+                if record["seq"] > after_seq:
+                    yield Event.from_dict(record)
+
+    def snapshot(self):
+        """Write a checkpoint of every projection at the current sequence number"""
+        if not self.snapshot_file:
+            return
+        state = {
+            "seq": self.seq,
+            "projections": [projection.snapshot() for projection in self.projections]
+        }
+        temp_file = self.snapshot_file + ".tmp"
+        with open(temp_file, 'w') as f:
+            json.dump(state, f)
+        os.replace(temp_file, self.snapshot_file)
+        self.snapshot_seq = self.seq
+
+    def write_genesis(self, state=None):
+        """Record the full projection state the log starts from"""
+        if not self.genesis_file:
+            return
+        if state is None:
+            state = {"seq": 0, "projections": [projection.genesis() for projection in self.projections]}
+        temp_file = self.genesis_file + ".tmp"
+        with open(temp_file, 'w') as f:
+            json.dump(state, f)
+        os.replace(temp_file, self.genesis_file)
+
+    def read_genesis(self):
+        """Return the checkpoint written by write_genesis, or None"""
+        if not self.genesis_file or not os.path.exists(self.genesis_file):
+            return None
+        with open(self.genesis_file, 'r') as f:
+            return json.load(f)
+
+    def read_snapshot(self):
+        """Return the latest checkpoint written by snapshot, or None"""
+        if not self.snapshot_file or not os.path.exists(self.snapshot_file):
+            return None
+        with open(self.snapshot_file, 'r') as f:
+            return json.load(f)
+
+    def load_snapshot(self, snapshot):
+        """Restore every projection from a checkpoint"""
+        for projection, state in zip(self.projections, snapshot["projections"]):
+            projection.restore(state)
+        self.seq = self.snapshot_seq = snapshot["seq"]
+
+    def _truncate_torn_tail(self):
+        """Cut off a final record left incomplete by a crash during append_many"""
+        if not self.log_file or not os.path.exists(self.log_file):
+            return
+        with open(self.log_file, 'r+b') as f:
+            end = f.seek(0, os.SEEK_END)
+            # Read back from the end until the newline before the last record
+            start, tail = end, b""
+            while start > 0 and tail.rfind(b"\n", 0, len(tail) - 1) < 0:
+                step = min(4096, start)
+                start -= step
+                f.seek(start)
+                tail = f.read(step) + tail
+            last = tail[tail.rfind(b"\n", 0, len(tail) - 1) + 1:]
+            # Records are written newline last, so one without it was cut short
+            if last and not last.endswith(b"\n"):
+                f.truncate(end - len(last))
+
+    def recover(self):
+        """Rebuild projections from the latest snapshot and replay the events after it"""
+        self._truncate_torn_tail()
+        snapshot = self.read_snapshot()
+        if snapshot is not None:
+            self.load_snapshot(snapshot)
+        elif self.log_file and os.path.exists(self.log_file) and os.path.getsize(self.log_file):
+            for projection in self.projections:
+                projection.reset()
+            self.seq = self.snapshot_seq = 0
+        else:
+            # Fresh log: the current projection state becomes the genesis checkpoint
+            self.snapshot()
+            self.write_genesis()
+            return 0
+
+        replayed = 0
+        for event in self.events(after_seq=self.seq):
+            for projection in self.projections:
+                projection.apply(event)
+            self.seq = event.seq
+            replayed += 1
+        return replayed
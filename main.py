@@ -1,8 +1,13 @@
 import tkinter as tk
-from tkinter import messagebox, ttk
-from atm import ATM
-import json
+from tkinter import messagebox
+from terminal import TkTerminalDriver
+from session import SessionManager
+from directory import is_valid_account_number
+from collections import deque
 from functools import partial
+import time
+import os
+import warnings
 
 # Modern UI constants
 COLORS = {
@@ -18,6 +23,13 @@ COLORS = {
     'muted': '#6c757d'            # Muted gray
 }
 
+# Session limits in seconds
+SESSION_IDLE_TIMEOUT = 120
+SESSION_ABSOLUTE_TIMEOUT = 900
+
+# Recent navigation timings kept per screen; a kiosk runs for weeks
+NAVIGATION_SAMPLES = 100
+
 # Create a custom style for widgets
 def create_button(parent, text, command, bg_color=COLORS['primary'], fg_color=COLORS['text_light'], width=15, height=2):
     """Create a modern styled button"""
@@ -81,6 +93,25 @@ def create_frame(parent, padding_x=10, padding_y=10):
         pady=padding_y
     )
 
+def load_atm():
+    """Build the terminal's ATM; runs on the driver's worker thread"""
+    # The account modules are imported here, off the path to the first screen
+    from atm import ATM
+    from audit import AuditLog
+    from risk import RiskScorer
+    audit_log = None
+    if os.environ.get("ATM_AUDIT_KEY"):
+        audit_log = AuditLog("audit.log")
+    else:
+        warnings.warn("ATM_AUDIT_KEY is not set; the audit log is disabled")
+    return ATM(risk_checks=[RiskScorer()], audit_log=audit_log)
+
+def _is_held(message):
+    """True if a deposit or withdrawal result says it was held for review"""
+    # The worker imported atm before any transaction could complete
+    from atm import HELD_FOR_REVIEW
+    return message == HELD_FOR_REVIEW
+
 def _adjust_lightness(color, factor):
     """Adjust the lightness of a hex color"""
     # Simple lightness adjustment - not for production use
@@ -96,9 +127,12 @@ def _adjust_lightness(color, factor):
 
 class ATMGUI:
     def __init__(self, root):
+        self.started = time.perf_counter()
         self.root = root
         self.root.title("ATM Simulator")
-        self.atm = ATM()
+        # ATM operations run on a background worker so slow saves never freeze the UI;
+        # the accounts are loaded there too while the login screen is already showing
+        self.driver = TkTerminalDriver(self.root, factory=load_atm, on_error=self._on_worker_error)
         
         # Configure full screen
         self.root.attributes('-fullscreen', True)
@@ -111,18 +145,126 @@ class ATMGUI:
         # Add ESC key binding to exit fullscreen
         self.root.bind('<Escape>', lambda e: self.root.attributes('-fullscreen', False))
         
-        # Reference to balance display label
+        # Screens are built once and swapped in and out of main_frame
+        self.screens = {}
+        self.current_screen = None
         self.balance_label = None
+        self.name_label = None
+        self.session_label = None
+        self.styles_ready = False
+        
+        # Walk-away sessions are logged out after SESSION_IDLE_TIMEOUT without input
+        self.sessions = SessionManager(SESSION_IDLE_TIMEOUT, SESSION_ABSOLUTE_TIMEOUT,
+                                       on_expire=self._on_session_expired)
+        self.session = None
+        self.root.bind_all('<Any-KeyPress>', self._touch_session, add='+')
+        self.root.bind_all('<Any-ButtonPress>', self._touch_session, add='+')
+        self.root.after(1000, self._reap_sessions)
+        
+        # Startup and navigation latency in seconds, measured up to the next redraw
+        self.startup_time = None
+        self.load_time = None
+        self.navigation_times = {}
+        
+        # Create and show login frame; LOGIN and REGISTER stay disabled until the accounts load
+        self.show_login_frame()
+        self.startup_time = time.perf_counter() - self.started
+        self._wait_for_accounts()
+        
+    def _wait_for_accounts(self):
+        """Show progress until the background account load finishes or fails"""
+        self.driver.when_loaded(self._on_accounts_loaded, on_error=self._on_load_failed)
+        self._animate_loading()
+        
+    def _on_accounts_loaded(self, atm):
+        """Enable the login screen once the account store is ready"""
+        self.load_time = time.perf_counter() - self.started
+        self.login_button.config(state=tk.NORMAL)
+        self.register_button.config(state=tk.NORMAL)
+        self.loading_label.config(text="")
+        
+    def _on_load_failed(self, error):
+        """Report a failed account load and offer to retry or exit"""
+        self.loading_label.config(text="Could not load accounts", fg=COLORS['danger'])
+        if messagebox.askretrycancel("Accounts Unavailable",
+                                     f"The account store could not be loaded:\n{error}\n\n"
+                                     "Retry, or Cancel to exit."):
+            self.loading_label.config(fg=COLORS['accent'])
+            self.driver.load()
+            self._wait_for_accounts()
+        else:
+            self.root.quit()
         
-        # Create and show login frame
-        self.create_login_frame()
+    def _animate_loading(self, dots=0):
+        """Show a progress indicator while the accounts are loading"""
+        if not self.driver.loading.done():
+            self.loading_label.config(text="Loading accounts" + "." * dots)
+            self.root.after(300, self._animate_loading, (dots + 1) % 4)
         
-    def create_login_frame(self):
-        """Create the login screen with modern styling"""
-        self.clear_frame()
+    def _setup_styles(self):
+        """Configure the shared ttk styles the first time they are needed"""
+        if self.styles_ready:
+            return
+        # ttk is only used by the history screen, so it is not loaded at startup
+        from tkinter import ttk
+        style = ttk.Style()
+        style.theme_use('default')
+        style.configure('Treeview', 
+                        background=COLORS['bg_medium'],
+                        foreground=COLORS['text_light'],
+                        rowheight=25,
+                        fieldbackground=COLORS['bg_medium'])
+        style.configure('Treeview.Heading', 
+                        background=COLORS['accent'],
+                        foreground=COLORS['text_light'],
+                        font=('Helvetica', 10, 'bold'))
+        style.map('Treeview', background=[('selected', COLORS['primary'])])
+        self.styles_ready = True
+        
+    def show_screen(self, name, builder):
+        """Show a cached screen, building it on first use"""
+        start = time.perf_counter()
+        screen = self.screens.get(name)
+        if screen is None:
+            screen = create_frame(self.main_frame, padding_x=0, padding_y=0)
+            builder(screen)
+            self.screens[name] = screen
+        if self.current_screen is not screen:
+            if self.current_screen is not None:
+                self.current_screen.pack_forget()
+            screen.pack(expand=True, fill='both')
+            self.current_screen = screen
+        self.root.update_idletasks()
+        if name not in self.navigation_times:
+            self.navigation_times[name] = deque(maxlen=NAVIGATION_SAMPLES)
+        self.navigation_times[name].append(time.perf_counter() - start)
+        return screen
+        
+    def show_login_frame(self):
+        """Show the login screen with empty fields"""
+        self.show_screen('login', self.create_login_frame)
+        self.account_entry.delete(0, tk.END)
+        self.pin_entry.delete(0, tk.END)
+        self.account_entry.focus_set()
         
+    def show_menu_frame(self, full_account):
+        """Show the main menu for the logged in customer"""
+        self.show_screen('menu', self.create_menu_frame)
+        if self.session is None:
+            self.session = self.sessions.open(full_account)
+        self.name_label.config(text="Welcome")
+        self.driver.call("get_customer_name",
+                         callback=lambda name: self.name_label.config(text=f"Welcome, {name}"))
+        self.update_balance_display()
+        
+    def _on_worker_error(self, error):
+        """Report an ATM operation that failed on the worker"""
+        messagebox.showerror("Error", f"The operation could not be completed:\n{error}")
+        
+    def create_login_frame(self, parent):
+        """Create the login screen with modern styling"""
         # Header container with logo effect
-        header_frame = create_frame(self.main_frame)
+        header_frame = create_frame(parent)
         header_frame.pack(pady=(20, 40))
         
         # Title with modern styling
@@ -135,7 +277,7 @@ class ATMGUI:
         
         # Login container with card-like effect
         login_container = tk.Frame(
-            self.main_frame,
+            parent,
             bg=COLORS['bg_medium'],
             padx=40,
             pady=40,
@@ -166,6 +308,7 @@ class ATMGUI:
         login_button = tk.Button(
             button_frame, 
             text="LOGIN",
+            state=tk.NORMAL if self.driver.is_loaded() else tk.DISABLED,
             command=self.login,
             font=('Helvetica', 12, 'bold'),
             bg='white',
@@ -183,12 +326,14 @@ class ATMGUI:
         login_button.pack(side=tk.LEFT, padx=(0, 10))
         login_button.bind("<Enter>", lambda e, c=COLORS['primary']: e.widget.config(bg=c, fg='white'))
         login_button.bind("<Leave>", lambda e: e.widget.config(bg='white', fg=COLORS['bg_dark']))
+        self.login_button = login_button
         
         # Register Button
         register_button = tk.Button(
             button_frame, 
             text="REGISTER",
             command=self.show_registration_dialog,
+            state=tk.NORMAL if self.driver.is_loaded() else tk.DISABLED,
             font=('Helvetica', 12, 'bold'),
             bg='white',
             fg=COLORS['bg_dark'],
@@ -205,6 +350,7 @@ class ATMGUI:
         register_button.pack(side=tk.LEFT, padx=10)
         register_button.bind("<Enter>", lambda e, c=COLORS['info']: e.widget.config(bg=c, fg='white'))
         register_button.bind("<Leave>", lambda e: e.widget.config(bg='white', fg=COLORS['bg_dark']))
+        self.register_button = register_button
         
         # Exit Button
         exit_button = tk.Button(
@@ -228,8 +374,12 @@ class ATMGUI:
         exit_button.bind("<Enter>", lambda e, c=COLORS['danger']: e.widget.config(bg=c, fg='white'))
         exit_button.bind("<Leave>", lambda e: e.widget.config(bg='white', fg=COLORS['bg_dark']))
         
+        # Account store loading progress, cleared by _on_accounts_loaded
+        self.loading_label = create_label(login_container, "", size=10, fg=COLORS['accent'], bg=COLORS['bg_medium'])
+        self.loading_label.pack(pady=(15, 0))
+        
         # Footer
-        footer_frame = create_frame(self.main_frame)
+        footer_frame = create_frame(parent)
         footer_frame.pack(side=tk.BOTTOM, fill='x', pady=20)
         
         footer_text = create_label(
@@ -240,29 +390,23 @@ class ATMGUI:
         )
         footer_text.pack(side=tk.RIGHT, padx=20)
         
-        # Focus on account entry
-        self.account_entry.focus_set()
-        
-    def create_menu_frame(self):
+    def create_menu_frame(self, parent):
         """Create the main menu screen with modern styling"""
-        self.clear_frame()
-        
         # Header with customer info
-        header_frame = create_frame(self.main_frame)
+        header_frame = create_frame(parent)
         header_frame.pack(fill='x', pady=(0, 30))
         
-        # Add current time indicator (just for visual effect)
-        time_label = create_label(header_frame, "Session Active", size=10, fg=COLORS['accent'])
-        time_label.pack(side=tk.RIGHT, padx=10)
+        # Session countdown, refreshed by _reap_sessions
+        self.session_label = create_label(header_frame, "Session Active", size=10, fg=COLORS['accent'])
+        self.session_label.pack(side=tk.RIGHT, padx=10)
         
-        # Customer welcome
-        customer_name = self.atm.get_customer_name()
-        name_label = create_label(header_frame, f"Welcome, {customer_name}", size=16, bold=True)
-        name_label.pack(side=tk.LEFT, padx=10)
+        # Customer welcome, filled in each time the menu is shown
+        self.name_label = create_label(header_frame, "", size=16, bold=True)
+        self.name_label.pack(side=tk.LEFT, padx=10)
         
         # Balance display
         balance_frame = tk.Frame(
-            self.main_frame,
+            parent,
             bg=COLORS['bg_medium'],
             padx=20,
             pady=15
@@ -281,7 +425,7 @@ class ATMGUI:
         # Store reference to the balance amount label for updates
         self.balance_label = create_label(
             balance_frame, 
-            f"\u20B9 {self.atm.check_balance():.2f}", 
+            "", 
             size=24, 
             bold=True,
             bg=COLORS['bg_medium']
@@ -289,7 +433,7 @@ class ATMGUI:
         self.balance_label.pack()
         
         # Menu container
-        menu_container = create_frame(self.main_frame)
+        menu_container = create_frame(parent)
         menu_container.pack(expand=True, fill='both')
         
         # Create a grid for menu options
@@ -368,19 +512,19 @@ class ATMGUI:
         menu_container.rowconfigure(0, weight=1)
         menu_container.rowconfigure(1, weight=1)
         
-    def clear_frame(self):
-        """Clear all widgets from the main frame"""
-        for widget in self.main_frame.winfo_children():
-            widget.destroy()
-            
     def login(self):
         """Handle login with full account number"""
         full_account = self.account_entry.get()
         pin = self.pin_entry.get()
         
-        success, message = self.atm.login(full_account, pin)
+        self.driver.call("login", full_account, pin,
+                         callback=partial(self._on_login, full_account))
+        
+    def _on_login(self, full_account, result):
+        """Show the menu or report the login failure"""
+        success, message = result
         if success:
-            self.create_menu_frame()
+            self.show_menu_frame(full_account)
         else:
             if "Please register" in message:
                 response = messagebox.askyesno("Account Not Found", 
@@ -414,9 +558,15 @@ class ATMGUI:
         
         account_entry = create_entry(container)
         account_entry.pack(fill='x', pady=(0, 15))
-        if account_number:
+        if is_valid_account_number(account_number):
             account_entry.insert(0, account_number)
             account_entry.config(state='readonly')
+        else:
+            # Suggest a fresh checksummed number rather than one that cannot be registered
+            def suggest(number):
+                if account_entry.winfo_exists() and not account_entry.get():
+                    account_entry.insert(0, number)
+            self.driver.call("allocate_account_number", callback=suggest)
         
         # Name
         name_label = create_label(container, "Full Name:")
@@ -457,9 +607,9 @@ class ATMGUI:
                 status_label.config(text="Invalid deposit amount")
                 return
             
-            # Check if account already exists
-            if full_account in self.atm.accounts:
-                status_label.config(text="Account already registered!")
+            # Existing accounts are refused by register_user on the worker
+            if not is_valid_account_number(full_account):
+                status_label.config(text="Invalid account number (check digit)")
                 return
                 
             if not name.strip():
@@ -470,16 +620,17 @@ class ATMGUI:
                 status_label.config(text="PIN must be 4 digits")
                 return
                 
-            success, message = self.atm.register_user(
-                full_account, name, pin, deposit
-            )
+            self.driver.call("register_user", full_account, name, pin, deposit,
+                             callback=partial(on_registered, full_account, pin))
             
+        def on_registered(full_account, pin, result):
+            success, message = result
             if success:
                 messagebox.showinfo("Success", message)
                 dialog.destroy()
                 # Auto-login the new user
-                self.atm.login(full_account, pin)
-                self.create_menu_frame()
+                self.driver.call("login", full_account, pin,
+                                 callback=lambda result: self.show_menu_frame(full_account))
             else:
                 status_label.config(text=message)
         
@@ -533,43 +684,88 @@ class ATMGUI:
         
     def logout(self):
         """Handle logout"""
-        self.atm.logout()
-        self.create_login_frame()
+        if self.session:
+            self.sessions.close(self.session.session_id)
+            self.session = None
+        self.driver.call("logout")
+        self.show_login_frame()
+        
+    def _touch_session(self, event=None):
+        """Reset the idle timer on any key press or click"""
+        if self.session:
+            self.sessions.touch(self.session.session_id)
+            
+    def _reap_sessions(self):
+        """Expire timed out sessions and refresh the countdown once a second"""
+        self.sessions.expire()
+        if self.session and self.session_label:
+            minutes, seconds = divmod(int(self.sessions.remaining(self.session.session_id)), 60)
+            self.session_label.config(text=f"Session expires in {minutes}:{seconds:02d}")
+        self.root.after(1000, self._reap_sessions)
+        
+    def _on_session_expired(self, session):
+        """Log out an abandoned session and return to the login screen"""
+        self.driver.call("expire_session", session.account)
+        if self.session is session:
+            self.session = None
+            for widget in self.root.winfo_children():
+                if isinstance(widget, tk.Toplevel):
+                    widget.destroy()
+            self.show_login_frame()
+            messagebox.showinfo("Session Expired", "You have been logged out due to inactivity.")
         
     def check_balance(self):
         """Show current balance"""
-        balance = self.atm.check_balance()
-        messagebox.showinfo("Account Balance", 
-                          f"Current Balance: \u20B9 {balance:.2f}")
-        
-    def update_balance_display(self):
-        """Update the balance display in the main menu"""
-        if hasattr(self, 'balance_label') and self.balance_label:
-            self.balance_label.config(text=f"\u20B9 {self.atm.check_balance():.2f}")
+        self.driver.call("check_balance", callback=lambda balance: messagebox.showinfo(
+            "Account Balance", f"Current Balance: \u20B9 {balance:.2f}"))
+        
+    def update_balance_display(self, then=None):
+        """Refresh the balance display in the main menu, then call then(balance)"""
+        def show(balance):
+            if self.balance_label and balance is not None:
+                self.balance_label.config(text=f"\u20B9 {balance:.2f}")
+            if then:
+                then(balance)
+        # Read on the worker, without recording a balance check
+        self.driver.call("get_balance", callback=show)
         
     def deposit(self):
         """Handle deposit"""
         amount = self.get_amount("Enter deposit amount:")
         if amount is not None:
-            if self.atm.deposit(amount):
-                messagebox.showinfo("Deposit Successful", 
-                                 f"\u20B9 {amount:.2f} deposited successfully.\nNew Balance: \u20B9 {self.atm.check_balance():.2f}")
-                # Update the balance display
-                self.update_balance_display()
-            else:
-                messagebox.showerror("Error", "Invalid deposit amount!")
+            self.driver.call("deposit", amount, callback=partial(self._on_deposit, amount))
                 
+    def _on_deposit(self, amount, result):
+        """Report the result of a deposit"""
+        success, message = result
+        if success:
+            # Update the balance display, then report the new balance
+            self.update_balance_display(lambda balance: messagebox.showinfo(
+                "Deposit Successful",
+                f"\u20B9 {amount:.2f} deposited successfully.\nNew Balance: \u20B9 {balance:.2f}"))
+        elif _is_held(message):
+            messagebox.showwarning("Held for Review", "This deposit has been held for review.")
+        else:
+            messagebox.showerror("Error", f"{message}!")
+
     def withdraw(self):
         """Handle withdrawal"""
         amount = self.get_amount("Enter withdrawal amount:")
         if amount is not None:
-            if self.atm.withdraw(amount):
-                messagebox.showinfo("Withdrawal Successful", 
-                                   f"\u20B9 {amount:.2f} withdrawn successfully.\nNew Balance: \u20B9 {self.atm.check_balance():.2f}")
-                # Update the balance display
-                self.update_balance_display()
-            else:
-                messagebox.showerror("Error", "Invalid amount or insufficient funds!")
+            self.driver.call("withdraw", amount, callback=partial(self._on_withdraw, amount))
+
+    def _on_withdraw(self, amount, result):
+        """Report the result of a withdrawal"""
+        success, message = result
+        if success:
+            # Update the balance display, then report the new balance
+            self.update_balance_display(lambda balance: messagebox.showinfo(
+                "Withdrawal Successful",
+                f"\u20B9 {amount:.2f} withdrawn successfully.\nNew Balance: \u20B9 {balance:.2f}"))
+        elif _is_held(message):
+            messagebox.showwarning("Held for Review", "This withdrawal has been held for review.")
+        else:
+            messagebox.showerror("Error", f"{message}!")
                 
     def change_pin(self):
         """Handle PIN change with modern styling"""
@@ -616,11 +812,15 @@ class ATMGUI:
                 messagebox.showerror("Error", "New PINs don't match!")
                 return
                 
-            if self.atm.change_pin(old_pin, new_pin):
-                messagebox.showinfo("Success", "PIN changed successfully!")
+            self.driver.call("change_pin", old_pin, new_pin, callback=on_changed)
+
+        def on_changed(result):
+            success, message = result
+            if success:
+                messagebox.showinfo("Success", f"{message}!")
                 dialog.destroy()
             else:
-                messagebox.showerror("Error", "Invalid current PIN or new PIN must be 4 digits!")
+                messagebox.showerror("Error", f"{message}!")
         
         # Confirm button
         confirm_button = tk.Button(
@@ -645,12 +845,18 @@ class ATMGUI:
         confirm_button.bind("<Leave>", lambda e: e.widget.config(bg='white', fg=COLORS['bg_dark']))
         
     def show_history(self):
+        """Fetch the transaction history on the worker, then show it"""
+        self.driver.call("get_transaction_history", callback=self._show_history_dialog)
+        
+    def _show_history_dialog(self, history):
         """Show transaction history with modern styling"""
-        history = self.atm.get_transaction_history()
         if not history:
             messagebox.showinfo("Transaction History", "No transactions found")
             return
             
+        from tkinter import ttk
+        self._setup_styles()
+        
         dialog = tk.Toplevel(self.root)
         dialog.title("Transaction History")
         dialog.geometry("500x400")
@@ -664,20 +870,6 @@ class ATMGUI:
         title = create_label(container, "Recent Transactions", size=18, bold=True)
         title.pack(pady=(0, 20))
         
-        # Create custom style for treeview
-        style = ttk.Style()
-        style.theme_use('default')
-        style.configure('Treeview', 
-                        background=COLORS['bg_medium'],
-                        foreground=COLORS['text_light'],
-                        rowheight=25,
-                        fieldbackground=COLORS['bg_medium'])
-        style.configure('Treeview.Heading', 
-                        background=COLORS['accent'],
-                        foreground=COLORS['text_light'],
-                        font=('Helvetica', 10, 'bold'))
-        style.map('Treeview', background=[('selected', COLORS['primary'])])
-        
         # Transaction list
         tree_frame = tk.Frame(container, bg=COLORS['bg_dark'])
         tree_frame.pack(fill='both', expand=True)
@@ -810,7 +1002,39 @@ class ATMGUI:
         
         return amount
 
+def startup_benchmark(runs=5):
+    """Start the GUI in fresh interpreters and time its first screen and account load"""
+    import statistics
+    import subprocess
+    import sys
+    first_screen, loaded = [], []
+    for _ in range(runs):
+        start = time.perf_counter()
+        probe = subprocess.Popen([sys.executable, __file__, "--startup-probe"],
+                                 stdout=subprocess.PIPE, text=True)
+        for line in probe.stdout:
+            elapsed = time.perf_counter() - start
+            if line.strip() == "first-screen":
+                first_screen.append(elapsed)
+            elif line.strip() == "loaded":
+                loaded.append(elapsed)
+        probe.wait()
+    return statistics.median(first_screen), statistics.median(loaded)
+
 if __name__ == "__main__":
+    import sys
+    if "--startup-benchmark" in sys.argv:
+        first_screen, loaded = startup_benchmark()
+        print(f"Cold start (median of 5): first screen {first_screen * 1000:.0f} ms, "
+              f"accounts loaded {loaded * 1000:.0f} ms")
+        sys.exit()
+        
     root = tk.Tk()
     app = ATMGUI(root)
-    root.mainloop()
\ No newline at end of file
+    if "--startup-probe" in sys.argv:
+        # Report milestones to startup_benchmark and quit once the accounts are loaded
+        root.update()
+        print("first-screen", flush=True)
+        app.driver.when_loaded(lambda atm: (print("loaded", flush=True), root.destroy()))
+    root.mainloop()
+    app.driver.shutdown()
\ No newline at end of file
@@ -0,0 +1,270 @@
+from datetime import datetime, timedelta
+import hashlib
+import hmac
+import json
+import os
+import uuid
+import zlib
+
+# Most a terminal will pay out per account while it cannot reach the core
+OFFLINE_FLOOR_LIMIT = 200.0
+
+# How long after an online PIN check a terminal may keep transacting offline for that account
+OFFLINE_AUTHORIZATION_TTL = timedelta(hours=24)
+
+# How far a terminal's clock may run behind the core's
+OFFLINE_CLOCK_SKEW = timedelta(minutes=5)
+
+
+class CoreUnavailable(Exception):
+    """Raised when the ATM core cannot be reached"""
+
+
+class LocalCore:
+    """In-process stand-in for the ATM core that can be paused to simulate an outage"""
+
+    def __init__(self, atm):
+        if not atm.terminal_key:
+            raise ValueError("The core needs a persistent terminal key: set ATM_TERMINAL_KEY")
+        self.atm = atm
+        self.paused = False
+
+    def pause(self):
+        self.paused = True
+
+    def resume(self):
+        self.paused = False
+
+    def _check_available(self):
+        if self.paused:
+            raise CoreUnavailable("ATM core is not reachable")
+
+    def get_balance(self, full_account):
+        """Return an account's balance for the terminal's offline cache"""
+        self._check_available()
+        record = self.atm.accounts.get(full_account)
+        return record["balance"] if record else None
+
+    def authorize(self, full_account, pin):
+        """Check a PIN online and return the account's authorization token, or None"""
+        self._check_available()
+        return self.atm.authorize_terminal(full_account, pin)
+
+    def apply_batch(self, payload):
+        """Post a compressed batch of queued transactions and return their results"""
+        self._check_available()
+        transactions = json.loads(zlib.decompress(payload))
+        return self.atm.post_offline_transactions(transactions)
+
+
+class ReconciliationReport:
+    """Outcome of syncing an offline queue to the core"""
+
+    def __init__(self):
+        self.posted = []
+        self.overdrawn = []
+        self.held = []
+        self.rejected = []
+        self.duplicates = []
+        self.pending = 0
+        self.batches = 0
+        self.bytes_sent = 0
+
+    def add(self, txn, status):
+        {"posted": self.posted, "overdrawn": self.overdrawn,
+         "rejected": self.rejected, "insufficient_funds": self.rejected, "held": self.held,
+         "duplicate": self.duplicates}[status].append(txn)
+
+    def summary(self):
+        """Return a one-line human readable summary"""
+        return (f"{len(self.posted)} posted, {len(self.overdrawn)} overdrawn, {len(self.held)} held, "
+                f"{len(self.rejected)} rejected, {len(self.duplicates)} duplicates, "
+                f"{self.pending} still queued ({self.batches} batches, {self.bytes_sent} bytes)")
+
+
+class OfflineTerminal:
+    """Terminal that queues deposits and limited withdrawals while the core is down.
+
+    Customers must authenticate first. The PIN is checked by the core when it
+    is reachable; otherwise against a salted hash kept from the account's last
+    online check, whose core-issued token is attached to queued transactions.
+    Nothing is accepted offline once that token is older than
+    OFFLINE_AUTHORIZATION_TTL.
+    """
+
+    def __init__(self, core, queue_file, floor_limit=OFFLINE_FLOOR_LIMIT):
+        self.core = core
+        self.queue_file = queue_file
+        self.floor_limit = floor_limit
+        # Last balance seen from the core, per account
+        self.cached_balances = {}
+        # full_account -> (salt, PIN hash, authorization token) from the last online check
+        self.credentials = {}
+        self.authenticated = set()
+        self.queue = self._load_queue()
+
+    def _load_queue(self):
+        """Load transactions that were queued before a restart"""
+        if not os.path.exists(self.queue_file):
+            return []
+        with open(self.queue_file, 'r') as f:
+            return [json.loads(line) for line in f if line.strip()]
+
+    def _append_to_queue(self, txn):
+        """Durably append one transaction to the local queue"""
+        with open(self.queue_file, 'a') as f:
+            f.write(json.dumps(txn) + "\n")
+            f.flush()
+            os.fsync(f.fileno())
+        self.queue.append(txn)
+
+    def _rewrite_queue(self, remaining):
+        """Replace the queue file with the transactions not yet synced"""
+        temp_file = self.queue_file + ".tmp"
+        with open(temp_file, 'w') as f:
+            for txn in remaining:
+                f.write(json.dumps(txn) + "\n")
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(temp_file, self.queue_file)
+        self.queue = remaining
+
+    def refresh_balance(self, full_account):
+        """Cache an account's balance from the core; returns None if the core is down"""
+        try:
+            balance = self.core.get_balance(full_account)
+        except CoreUnavailable:
+            return None
+        if balance is not None:
+            self.cached_balances[full_account] = balance
+        return balance
+
+    def authenticate(self, full_account, pin):
+        """Check a customer's PIN, online if possible, and start their session"""
+        try:
+            token = self.core.authorize(full_account, pin)
+        except CoreUnavailable:
+            cached = self.credentials.get(full_account)
+            if cached is None or not hmac.compare_digest(cached[1], self._hash_pin(cached[0], pin)):
+                return False
+            if self._authorization_expired(full_account):
+                return False
+        else:
+            if token is None:
+                self.credentials.pop(full_account, None)
+                return False
+            salt = os.urandom(16)
+            self.credentials[full_account] = (salt, self._hash_pin(salt, pin), token)
+            self.refresh_balance(full_account)
+        self.authenticated.add(full_account)
+        return True
+
+    def end_session(self, full_account):
+        """End a customer's session; their cached credentials stay for offline use"""
+        self.authenticated.discard(full_account)
+
+    def _hash_pin(self, salt, pin):
+        return hashlib.pbkdf2_hmac("sha256", pin.encode(), salt, 100000)
+
+    def _authorization_expired(self, full_account):
+        """True if the account's token is too old for the core to accept offline transactions"""
+        issued_at = self.credentials[full_account][2].partition("|")[0]
+        age = datetime.now() - datetime.strptime(issued_at, "%Y-%m-%d %H:%M:%S")
+        return age > OFFLINE_AUTHORIZATION_TTL
+
+    def offline_limit(self, full_account):
+        """Amount this terminal may still pay out for an account while offline"""
+        if full_account not in self.cached_balances:
+            return 0.0
+        paid_out = sum(txn["amount"] for txn in self.queue
+                       if txn["account"] == full_account and txn["kind"] == "withdraw")
+        return max(0.0, min(self.floor_limit, self.cached_balances[full_account]) - paid_out)
+
+    def deposit(self, full_account, amount):
+        """Accept a deposit, queueing it if the core is unreachable"""
+        if amount <= 0:
+            return False, "Invalid deposit amount"
+        return self._submit(full_account, "deposit", amount)
+
+    def withdraw(self, full_account, amount):
+        """Pay out a withdrawal, within the offline floor limit if the core is unreachable"""
+        if amount <= 0:
+            return False, "Invalid withdrawal amount"
+        return self._submit(full_account, "withdraw", amount)
+
+    def _submit(self, full_account, kind, amount):
+        if full_account not in self.authenticated:
+            return False, "Not authenticated"
+        txn = {
+            "key": uuid.uuid4().hex,
+            "account": full_account,
+            "kind": kind,
+            "amount": float(amount),
+            "queued_at": datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+            "authorization": self.credentials[full_account][2],
+            "offline": False
+        }
+
+        # Older queued transactions go first so the core sees them in order
+        if not self.queue:
+            try:
+                (_, status), = self.core.apply_batch(self._compress([txn]))
+            except CoreUnavailable:
+                pass
+            else:
+                self.refresh_balance(full_account)
+                return status == "posted", status
+
+        if self._authorization_expired(full_account):
+            return False, "Offline authorization expired"
+        if kind == "withdraw" and amount > self.offline_limit(full_account):
+            return False, "Offline withdrawal limit exceeded"
+        txn["offline"] = True
+        self._append_to_queue(txn)
+        return True, "queued"
+
+    def _compress(self, transactions):
+        return zlib.compress(json.dumps(transactions).encode())
+
+    def sync(self, batch_size=100):
+        """Send queued transactions to the core in compressed batches and reconcile"""
+        report = ReconciliationReport()
+        queued = list(self.queue)
+        sent = 0
+        while sent < len(queued):
+            batch = queued[sent:sent + batch_size]
+            payload = self._compress(batch)
+            try:
+                results = self.core.apply_batch(payload)
+            except CoreUnavailable:
+                break
+            for txn, (_, status) in zip(batch, results):
+                report.add(txn, status)
+            report.batches += 1
+            report.bytes_sent += len(payload)
+            sent += len(batch)
+            # Keys make a batch safe to resend if we crash before this rewrite
+            self._rewrite_queue(queued[sent:])
+
+        report.pending = len(self.queue)
+        for full_account in {txn["account"] for txn in queued[:sent]}:
+            self.refresh_balance(full_account)
+        return report
+
+
+if __name__ == "__main__":
+    import tempfile
+    from atm import ATM
+
+    core = LocalCore(ATM(accounts_file=None, terminal_key=os.urandom(32)))
+    with tempfile.TemporaryDirectory() as workdir:
+        terminal = OfflineTerminal(core, os.path.join(workdir, "queue.jsonl"))
+        terminal.authenticate("10001234", "1234")
+        print("Online withdrawal of 5000.00:", terminal.withdraw("10001234", 5000.0))
+        core.pause()
+        for amount in (50.0, 100.0, 75.0):
+            print(f"Offline withdrawal of {amount:.2f}:", terminal.withdraw("10001234", amount))
+        print("Offline deposit of 20.00:", terminal.deposit("10001234", 20.0))
+        core.resume()
+        print("Sync:", terminal.sync().summary())
+        print("Core balance:", core.get_balance("10001234"))
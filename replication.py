@@ -0,0 +1,315 @@
+from collections import deque
+import json
+import multiprocessing
+import os
+import queue
+import socket
+import threading
+import time
+
+from atm import ATM
+from ledger import Ledger, Event, AccountsProjection, ReviewQueue
+from idempotency import IdempotencyTable
+
+
+class ReplicationPrimary:
+    """Stream a ledger's mutation log to standby processes over local sockets"""
+
+    def __init__(self, ledger, host="127.0.0.1", port=0, heartbeat_interval=0.5):
+        if not ledger.log_file:
+            raise ValueError("Replication needs a ledger with a log_file to ship")
+        self.ledger = ledger
+        # Idle streams send the primary's head seq this often so standbys can measure lag
+        self.heartbeat_interval = heartbeat_interval
+        self._server = socket.create_server((host, port))
+        self.address = self._server.getsockname()
+        self._standbys = []
+        self._lock = threading.Lock()
+        self._closed = False
+        ledger.subscribe(self._ship)
+        threading.Thread(target=self._accept_loop, daemon=True).start()
+
+    def _accept_loop(self):
+        """Accept standby connections until closed"""
+        while not self._closed:
+            try:
+                conn, _ = self._server.accept()
+            except OSError:
+                return
+            threading.Thread(target=self._serve, args=(conn,), daemon=True).start()
+
+    def _serve(self, conn):
+        """Catch a standby up from its last applied event, then stream new ones"""
+        outbox = queue.Queue()
+        try:
+            with conn, conn.makefile('rw') as stream:
+                self._stream(stream, outbox)
+        except OSError:
+            pass  # the standby went away
+        finally:
+            with self._lock:
+                if outbox in self._standbys:
+                    self._standbys.remove(outbox)
+
+    def _stream(self, stream, outbox):
+        def send(message):
+            # Stamped when written, so every message carries the primary's current head
+            message["primary_seq"] = self.ledger.seq
+            message["sent_at"] = time.time()
+            stream.write(json.dumps(message) + "\n")
+            stream.flush()
+
+        after_seq = json.loads(stream.readline())["after_seq"]
+        # Events after `head` are shipped to the outbox from here on; older ones
+        # are read from the log without holding the lock the write path needs
+        with self._lock:
+            head = self.ledger.seq
+            self._standbys.append(outbox)
+            if self._closed:
+                outbox.put(None)
+
+        if all(projection.portable for projection in self.ledger.projections):
+            snapshot = self.ledger.read_snapshot()
+        else:
+            # Snapshots only point into the primary's own account store; a new
+            # standby starts from the genesis records and replays the whole log
+            snapshot = self.ledger.read_genesis() if after_seq == 0 else None
+        if snapshot and (after_seq == 0 or after_seq < snapshot["seq"]):
+            send({"kind": "snapshot", "snapshot": snapshot})
+            after_seq = snapshot["seq"]
+        sent_seq = after_seq
+        try:
+            for event in self.ledger.events(after_seq):
+                if event.seq > head:
+                    break
+                send(self._message(event))
+                sent_seq = event.seq
+        except ValueError:
+            # A batch still being written; its events are queued in the outbox
+            pass
+
+        while True:
+            try:
+                message = outbox.get(timeout=self.heartbeat_interval)
+            except queue.Empty:
+                send({"kind": "heartbeat"})
+                continue
+            if message is None:
+                return
+            # Shipped while catch-up was reading the log too
+            if message["event"]["seq"] <= sent_seq:
+                continue
+            send(dict(message))
+            sent_seq = message["event"]["seq"]
+
+    def _message(self, event):
+        return {"kind": "event", "event": event.to_dict()}
+
+    def _ship(self, event):
+        """Ledger subscriber: queue the event for every connected standby"""
+        with self._lock:
+            message = self._message(event)
+            for outbox in self._standbys:
+                outbox.put(message)
+
+    def close(self):
+        """Stop accepting standbys and disconnect the current ones"""
+        self._closed = True
+        self._server.close()
+        with self._lock:
+            for outbox in self._standbys:
+                outbox.put(None)
+
+
+class ReplicationStandby:
+    """Apply a primary's log continuously and answer read-only queries"""
+
+    def __init__(self, primary_address, ledger_file, accounts_file=None):
+        self.accounts = {}
+        self.accounts_file = accounts_file
+        # Same projections as ATM, so a promoted standby can use the snapshots
+        self.ledger = Ledger(ledger_file, [AccountsProjection(self.accounts), IdempotencyTable(),
+                                           ReviewQueue()])
+        self.ledger.recover()
+        self.primary_seq = self.ledger.seq
+        # (primary_seq, sent_at) points the standby has not applied up to yet, oldest first
+        self._unapplied = deque()
+        self._lag_lock = threading.Lock()
+        self.connected = False
+        # Set if a message could not be applied; the standby is then behind for good
+        self.error = None
+        self._stopping = False
+        self._sock = socket.create_connection(primary_address)
+        self._thread = threading.Thread(target=self._receive_loop, daemon=True)
+        self._thread.start()
+
+    def _receive_loop(self):
+        """Apply shipped events in order until the primary goes away"""
+        try:
+            with self._sock, self._sock.makefile('rw') as stream:
+                stream.write(json.dumps({"after_seq": self.ledger.seq}) + "\n")
+                stream.flush()
+                self.connected = True
+                for line in stream:
+                    # Lines already buffered are dropped once promotion has begun
+                    if self._stopping:
+                        break
+                    if not line.endswith("\n"):
+                        break  # cut off when the primary went away
+                    message = json.loads(line)
+                    if message["kind"] == "snapshot":
+                        self.ledger.load_snapshot(message["snapshot"])
+                        self.ledger.snapshot()
+                        if message["snapshot"]["seq"] == 0:
+                            self.ledger.write_genesis(message["snapshot"])
+                    elif message["kind"] == "event":
+                        event = Event.from_dict(message["event"])
+                        # Events already applied (e.g. shipped twice during catch-up) are skipped
+                        if event.seq > self.ledger.seq:
+                            self.ledger.append(event)
+                    self._track_lag(message["primary_seq"], message["sent_at"])
+        except OSError:
+            pass  # the primary went away
+        except Exception as exc:
+            self.error = exc
+        finally:
+            self.connected = False
+
+    def _track_lag(self, primary_seq, sent_at):
+        """Record the primary's head from a message and drop points now applied"""
+        with self._lag_lock:
+            self.primary_seq = max(self.primary_seq, primary_seq)
+            if primary_seq > self.ledger.seq and (
+                    not self._unapplied or self._unapplied[-1][0] < primary_seq):
+                self._unapplied.append((primary_seq, sent_at))
+            while self._unapplied and self._unapplied[0][0] <= self.ledger.seq:
+                self._unapplied.popleft()
+
+    def lag(self):
+        """Return how many events the standby is behind the primary"""
+        return max(0, self.primary_seq - self.ledger.seq)
+
+    def lag_seconds(self):
+        """Return how long ago the primary sent the oldest head seq not yet applied here"""
+        with self._lag_lock:
+            if not self._unapplied:
+                return 0.0
+            return time.time() - self._unapplied[0][1]
+
+    def wait_for_catch_up(self, timeout=5.0):
+        """Block until the standby has applied everything the primary sent"""
+        deadline = time.monotonic() + timeout
+        while time.monotonic() < deadline:
+            if self.error is not None:
+                return False
+            if self.connected and not self.lag():
+                return True
+            time.sleep(0.01)
+        return False
+
+    def wait_for_disconnect(self, timeout=None):
+        """Block until the primary's stream ends"""
+        self._thread.join(timeout)
+        return not self._thread.is_alive()
+
+    def check_balance(self, full_account):
+        """Read-only balance lookup"""
+        record = self.accounts.get(full_account)
+        return record["balance"] if record else None
+
+    def get_transaction_history(self, full_account):
+        """Read-only lookup of the last 5 transactions"""
+        record = self.accounts.get(full_account)
+        return record["transaction_history"][-5:] if record else []
+
+    def promote(self, timeout=5.0):
+        """Fail over: turn the standby's replicated log into a writable ATM"""
+        # shutdown() ends the stream even though makefile() still holds the socket open
+        self._stopping = True
+        try:
+            self._sock.shutdown(socket.SHUT_RDWR)
+        except OSError:
+            pass  # the primary already closed it
+        self._sock.close()
+        if not self.wait_for_disconnect(timeout):
+            # Promoting now would let the old primary keep writing to our log
+            raise RuntimeError("Standby is still applying events from the primary")
+        if self.error is not None:
+            raise RuntimeError(f"Standby stopped applying the primary's log: {self.error!r}")
+        self.ledger.snapshot()
+        return ATM(self.accounts_file, self.ledger.log_file)
+
+
+def _run_standby(primary_address, ledger_file, results):
+    """Standby process for the failover check: replicate, then promote on request"""
+    standby = ReplicationStandby(primary_address, ledger_file)
+    results.put(("ready", None))
+    standby.wait_for_disconnect()
+    try:
+        atm = standby.promote()
+    except RuntimeError as exc:
+        results.put(("refused", str(exc)))
+        return
+    atm.login("10001234", "1234")
+    results.put(("promoted", atm.check_balance()))
+
+
+def check_failover(workdir):
+    """Replicate to a standby process, stop the primary and verify the promoted standby"""
+    primary = ATM(None, os.path.join(workdir, "primary.jsonl"))
+    shipper = ReplicationPrimary(primary.ledger)
+
+    results = multiprocessing.Queue()
+    process = multiprocessing.Process(
+        target=_run_standby,
+        args=(shipper.address, os.path.join(workdir, "standby.jsonl"), results)
+    )
+    process.start()
+    results.get(timeout=10)
+
+    primary.login("10001234", "1234")
+    for _ in range(100):
+        primary.deposit(5.0)
+    primary.withdraw(20.0)
+    expected = primary.accounts["10001234"]["balance"]
+
+    # Primary goes away once its queued events are sent; the standby
+    # notices the closed stream and promotes itself
+    shipper.close()
+    status, balance = results.get(timeout=10)
+    process.join(timeout=10)
+    return status == "promoted" and balance == expected, expected, balance
+
+
+def check_failed_standby(workdir):
+    """Ship an event the standby process cannot apply and verify it refuses to promote"""
+    server = socket.create_server(("127.0.0.1", 0))
+    results = multiprocessing.Queue()
+    process = multiprocessing.Process(
+        target=_run_standby,
+        args=(server.getsockname(), os.path.join(workdir, "failed.jsonl"), results)
+    )
+    process.start()
+    conn, _ = server.accept()
+    with conn, conn.makefile('rw') as stream:
+        stream.readline()
+        results.get(timeout=10)
+        # A deposit to an account the standby has never seen
+        event = {"seq": 1, "type": "Deposited", "account": "00000000",
+                 "timestamp": "2025-01-01 00:00:00", "data": {"amount": 1.0}}
+        stream.write(json.dumps({"kind": "event", "event": event,
+                                 "primary_seq": 1, "sent_at": time.time()}) + "\n")
+        stream.flush()
+    server.close()
+    status, detail = results.get(timeout=10)
+    process.join(timeout=10)
+    return status == "refused", detail
+
+
+if __name__ == "__main__":
+    import tempfile
+    with tempfile.TemporaryDirectory() as workdir:
+        ok, expected, actual = check_failover(workdir)
+        print(f"Failover {'passed' if ok else 'FAILED'}: primary {expected:.2f}, promoted standby {actual:.2f}")
+        ok, detail = check_failed_standby(workdir)
+        print(f"Failed standby {'refused to promote' if ok else 'PROMOTED'}: {detail}")
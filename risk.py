@@ -0,0 +1,115 @@
+from array import array
+import time
+
+from atm import ATM
+
+
+class RiskScorer:
+    """Score deposits and withdrawals from incrementally updated per-account features.
+
+    Features live in flat arrays indexed by a per-account slot and are updated
+    from ledger events as they happen, so scoring never rescans history:
+    - an exponentially weighted average transaction amount
+    - the number of transactions in the current time window
+    - the time of the last login
+
+    Features are only learned from events seen while running; they are not
+    rebuilt from the ledger on start, so after a restart every account scores
+    as new until min_observations transactions have been made.
+    """
+
+    def __init__(self, threshold=0.7, alpha=0.2, window=60.0, max_per_window=10,
+                 min_dwell=1.0, min_observations=3, clock=time.time):
+        self.threshold = threshold
+        self.alpha = alpha
+        self.window = window
+        self.max_per_window = max_per_window
+        self.min_dwell = min_dwell
+        self.min_observations = min_observations
+        self.clock = clock
+
+        self._slots = {}
+        self.average_amount = array('d')
+        self.observations = array('l')
+        self.window_start = array('d')
+        self.window_count = array('l')
+        self.last_login = array('d')
+
+    def _slot(self, full_account):
+        slot = self._slots.get(full_account)
+        if slot is None:
+            slot = len(self._slots)
+            self._slots[full_account] = slot
+            self.average_amount.append(0.0)
+            self.observations.append(0)
+            self.window_start.append(0.0)
+            self.window_count.append(0)
+            self.last_login.append(0.0)
+        return slot
+
+    def on_event(self, event):
+        """Ledger subscriber: fold an applied event into the account's features"""
+        if event.type == "LoggedIn":
+            self.last_login[self._slot(event.account)] = self.clock()
+        elif event.type in ("Deposited", "Withdrawn"):
+            slot = self._slot(event.account)
+            amount = event.data["amount"]
+            if self.observations[slot]:
+                self.average_amount[slot] += self.alpha * (amount - self.average_amount[slot])
+            else:
+                self.average_amount[slot] = amount
+            self.observations[slot] += 1
+
+            now = self.clock()
+            if now - self.window_start[slot] >= self.window:
+                self.window_start[slot] = now
+                self.window_count[slot] = 0
+            self.window_count[slot] += 1
+
+    def score(self, full_account, kind, amount):
+        """Return a 0-1 risk score for a proposed transaction"""
+        slot = self._slot(full_account)
+        now = self.clock()
+
+        # Unusually large compared with this account's own history
+        size = 0.0
+        if self.observations[slot] >= self.min_observations:
+            ratio = amount / max(self.average_amount[slot], 1.0)
+            size = min(max(ratio - 1.0, 0.0) / 9.0, 1.0)
+
+        # Burst of activity inside the current window
+        count = self.window_count[slot] if now - self.window_start[slot] < self.window else 0
+        velocity = min(count / self.max_per_window, 1.0)
+
+        # Withdrawal made almost immediately after login (scripted cash-out)
+        rushed = 1.0 if kind == "withdraw" and now - self.last_login[slot] < self.min_dwell else 0.0
+
+        # A 10x outlier is enough on its own; bursts and rushed withdrawals add to it
+        return min(0.7 * size + 0.3 * velocity + 0.2 * rushed, 1.0)
+
+
+def benchmark(operations=20000):
+    """Measure scoring latency and the overhead it adds to deposits"""
+    def run(atm):
+        atm.login("10001234", "1234")
+        start = time.perf_counter()
+        for _ in range(operations):
+            atm.deposit(1.0)
+        return (time.perf_counter() - start) / operations
+
+    # A window that never fills keeps every deposit approved, so both runs do the same work
+    scorer = RiskScorer(max_per_window=10 ** 9)
+    baseline = run(ATM(accounts_file=None))
+    scored = run(ATM(accounts_file=None, risk_checks=[scorer]))
+
+    start = time.perf_counter()
+    for _ in range(operations):
+        scorer.score("10001234", "withdraw", 50.0)
+    score_time = (time.perf_counter() - start) / operations
+    return score_time, baseline, scored
+
+
+if __name__ == "__main__":
+    score_time, baseline, scored = benchmark()
+    print(f"score(): {score_time * 1e6:.2f} us; deposit {baseline * 1e6:.2f} us unscored, "
+          f"{scored * 1e6:.2f} us scored (+{(scored - baseline) * 1e6:.2f} us)")
@@ -0,0 +1,217 @@
+from bisect import bisect_right
+from datetime import date, datetime
+import json
+import os
+import time
+
+from ledger import AccountOpened, InterestAccrued, FeeCharged
+
+
+class BatchJob:
+    """A pass over every account, processed in chunks"""
+    name = "job"
+    # "daily" or "monthly"
+    frequency = "daily"
+
+    def process_chunk(self, atm, account_numbers, run_id, timestamp):
+        """Return the events for one chunk of accounts"""
+        raise NotImplementedError
+
+
+class InterestAccrualJob(BatchJob):
+    """Credit one day of interest on every positive balance.
+
+    Interest is credited in whole cents; the remainder is carried on the
+    account (interest_carry) into the next day, so small balances still earn.
+    """
+    name = "interest"
+    frequency = "daily"
+
+    def __init__(self, annual_rate=0.035):
+        self.annual_rate = annual_rate
+
+    def process_chunk(self, atm, account_numbers, run_id, timestamp):
+        daily_rate = self.annual_rate / 365
+        events = []
+        for n in account_numbers:
+            record = atm.accounts[n]
+            if record["balance"] <= 0:
+                continue
+            accrued = record["balance"] * daily_rate + record.get("interest_carry", 0.0)
+            amount = round(accrued, 2)
+            events.append(InterestAccrued(n, timestamp, amount=amount, carry=accrued - amount, run=run_id))
+        return events
+
+
+class MonthlyFeeJob(BatchJob):
+    """Charge a maintenance fee on accounts below the minimum balance"""
+    name = "monthly-fee"
+    frequency = "monthly"
+
+    def __init__(self, fee=2.0, minimum_balance=500.0):
+        self.fee = fee
+        self.minimum_balance = minimum_balance
+
+    def process_chunk(self, atm, account_numbers, run_id, timestamp):
+        balances = [atm.accounts[n]["balance"] for n in account_numbers]
+        return [
+            FeeCharged(n, timestamp, amount=self.fee, description="Monthly Fee", run=run_id)
+            for n, b in zip(account_numbers, balances)
+            if self.fee <= b < self.minimum_balance
+        ]
+
+
+class StatementJob(BatchJob):
+    """Write a monthly statement line per account, one JSON lines file per chunk.
+
+    Files go to statement_dir/<period>/<first account>.jsonl and are renamed
+    into place once complete, so a chunk rerun after a crash finds its file
+    and is not written twice.
+    """
+    name = "statement"
+    frequency = "monthly"
+
+    def __init__(self, statement_dir="statements"):
+        self.statement_dir = statement_dir
+
+    def chunk_file(self, run_id, first_account):
+        period = run_id.partition(":")[2]
+        return os.path.join(self.statement_dir, period, f"{first_account}.jsonl")
+
+    def process_chunk(self, atm, account_numbers, run_id, timestamp):
+        path = self.chunk_file(run_id, account_numbers[0])
+        if os.path.exists(path):
+            return []
+        lines = []
+        for n in account_numbers:
+            record = atm.accounts[n]
+            lines.append(json.dumps({
+                "run": run_id,
+                "account": n,
+                "name": record["name"],
+                "balance": record["balance"],
+                "generated_at": timestamp
+            }) + "\n")
+        # One write per chunk, like the ledger commits
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        temp_file = path + ".tmp"
+        with open(temp_file, 'w') as f:
+            f.write("".join(lines))
+        os.replace(temp_file, path)
+        return []
+
+
+class JobScheduler:
+    """Run batch jobs over all accounts in resumable, checkpointed chunks.
+
+    The ATM needs a ledger log: a chunk committed just before a crash is only
+    recognised on resume by its idempotency key, which the log preserves.
+    """
+
+    def __init__(self, atm, checkpoint_file="jobs.json", chunk_size=1000, progress=None):
+        if not atm.ledger.log_file:
+            raise ValueError("Batch jobs need an ATM with a ledger_file to resume safely")
+        self.atm = atm
+        self.checkpoint_file = checkpoint_file
+        self.chunk_size = chunk_size
+        # Called as progress(job_name, processed, total, accounts_per_second)
+        self.progress = progress
+        self.jobs = []
+        self.state = self._load_state()
+
+    def _load_state(self):
+        """Load last run dates and unfinished run positions"""
+        if os.path.exists(self.checkpoint_file):
+            with open(self.checkpoint_file, 'r') as f:
+                return json.load(f)
+        return {"last_run": {}, "runs": {}}
+
+    def _save_state(self):
+        temp_file = self.checkpoint_file + ".tmp"
+        with open(temp_file, 'w') as f:
+            json.dump(self.state, f, indent=4)
+        os.replace(temp_file, self.checkpoint_file)
+
+    def add(self, job):
+        self.jobs.append(job)
+
+    def _period(self, job, run_date):
+        if job.frequency == "monthly":
+            return run_date.strftime("%Y-%m")
+        return run_date.isoformat()
+
+    def due_jobs(self, run_date=None):
+        """Return jobs that have not completed for the current day or month"""
+        run_date = run_date or date.today()
+        return [job for job in self.jobs
+                if self.state["last_run"].get(job.name) != self._period(job, run_date)]
+
+    def run_due(self, run_date=None):
+        """Run every due job and return their statistics"""
+        run_date = run_date or date.today()
+        return [self.run(job, run_date) for job in self.due_jobs(run_date)]
+
+    def run(self, job, run_date=None):
+        """Run one job to completion, resuming after its last committed chunk"""
+        run_date = run_date or date.today()
+        run_id = f"{job.name}:{self._period(job, run_date)}"
+        timestamp = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+
+        account_numbers = sorted(self.atm.accounts)
+        # Resume by account number rather than index, so new accounts don't shift the position
+        last_account = self.state["runs"].get(run_id)
+        start = bisect_right(account_numbers, last_account) if last_account else 0
+
+        processed = 0
+        posted = 0
+        started = time.perf_counter()
+        for i in range(start, len(account_numbers), self.chunk_size):
+            chunk = account_numbers[i:i + self.chunk_size]
+            # A chunk committed just before a crash, but not checkpointed, is skipped on resume
+            chunk_key = f"{run_id}:{chunk[0]}"
+            if chunk_key not in self.atm.idempotency:
+                events = job.process_chunk(self.atm, chunk, run_id, timestamp)
+                posted += self.atm.commit_batch(events, chunk_key)
+
+            processed += len(chunk)
+            self.state["runs"][run_id] = chunk[-1]
+            self._save_state()
+            if self.progress:
+                elapsed = time.perf_counter() - started
+                self.progress(job.name, start + processed, len(account_numbers),
+                              processed / elapsed if elapsed else 0.0)
+
+        self.state["runs"].pop(run_id, None)
+        self.state["last_run"][job.name] = self._period(job, run_date)
+        self._save_state()
+
+        elapsed = time.perf_counter() - started
+        return {
+            "job": job.name,
+            "run": run_id,
+            "resumed_from": start,
+            "processed": processed,
+            "posted": posted,
+            "seconds": elapsed,
+            "accounts_per_second": processed / elapsed if elapsed else 0.0
+        }
+
+
+if __name__ == "__main__":
+    import tempfile
+    from atm import ATM
+
+    with tempfile.TemporaryDirectory() as workdir:
+        atm = ATM(None, os.path.join(workdir, "ledger.jsonl"))
+        atm.commit_batch([
+            AccountOpened(f"{3000000000 + i}", "2025-01-01 00:00:00",
+                          name=f"Customer {i}", pin="0000", initial_deposit=float(i % 2000))
+            for i in range(100000)
+        ])
+        scheduler = JobScheduler(atm, os.path.join(workdir, "jobs.json"), chunk_size=5000)
+        scheduler.add(InterestAccrualJob())
+        scheduler.add(MonthlyFeeJob())
+        scheduler.add(StatementJob(os.path.join(workdir, "statements")))
+        for stats in scheduler.run_due():
+            print(f"{stats['job']}: {stats['processed']} accounts, {stats['posted']} postings, "
+                  f"{stats['accounts_per_second']:,.0f} accounts/sec")
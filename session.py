@@ -0,0 +1,113 @@
+import heapq
+import itertools
+import time
+
+
+class Session:
+    """A logged-in terminal session and its timing"""
+    __slots__ = ("session_id", "account", "started_at", "last_active")
+
+    def __init__(self, session_id, account, now):
+        self.session_id = session_id
+        self.account = account
+        self.started_at = now
+        self.last_active = now
+
+
+class SessionManager:
+    """Track open sessions and expire them after idle or absolute timeouts.
+
+    Each session has one entry in a min-heap keyed by its deadline. Activity
+    only updates last_active; when an entry comes due the real deadline is
+    recomputed and the entry is pushed back if the session was used since, so
+    an expiry pass only touches sessions that are actually due.
+    """
+
+    def __init__(self, idle_timeout=120, absolute_timeout=900, on_expire=None, clock=time.monotonic):
+        self.idle_timeout = idle_timeout
+        self.absolute_timeout = absolute_timeout
+        self.on_expire = on_expire
+        self.clock = clock
+        self.sessions = {}
+        self._heap = []
+        self._ids = itertools.count(1)
+
+    def __len__(self):
+        return len(self.sessions)
+
+    def _deadline(self, session):
+        return min(session.last_active + self.idle_timeout,
+                   session.started_at + self.absolute_timeout)
+
+    def open(self, account):
+        """Start a session for an account and return it"""
+        session = Session(next(self._ids), account, self.clock())
+        self.sessions[session.session_id] = session
+        heapq.heappush(self._heap, (self._deadline(session), session.session_id))
+        return session
+
+    def touch(self, session_id):
+        """Record activity on a session; returns False if it is no longer open"""
+        session = self.sessions.get(session_id)
+        if session is None:
+            return False
+        session.last_active = self.clock()
+        return True
+
+    def remaining(self, session_id):
+        """Seconds until the session expires, or 0 if it is closed"""
+        session = self.sessions.get(session_id)
+        if session is None:
+            return 0
+        return max(0, self._deadline(session) - self.clock())
+
+    def close(self, session_id):
+        """End a session normally (its heap entry is dropped when it comes due)"""
+        return self.sessions.pop(session_id, None)
+
+    def expire(self):
+        """End every session past its deadline and return them"""
+        now = self.clock()
+        expired = []
+        while self._heap and self._heap[0][0] <= now:
+            _, session_id = heapq.heappop(self._heap)
+            session = self.sessions.get(session_id)
+            if session is None:
+                continue
+            deadline = self._deadline(session)
+            if deadline > now:
+                # Used since this entry was scheduled
+                heapq.heappush(self._heap, (deadline, session_id))
+                continue
+            self.close(session_id)
+            expired.append(session)
+            if self.on_expire:
+                self.on_expire(session)
+        return expired
+
+
+def benchmark(open_sessions=100000, idle_timeout=600):
+    """Time expiry passes (one per simulated second) over many open sessions"""
+    now = [0.0]
+    manager = SessionManager(idle_timeout=idle_timeout, absolute_timeout=3600, clock=lambda: now[0])
+    # Logins spread evenly over the idle window, so roughly 1/idle_timeout of them are due each second
+    for i in range(open_sessions):
+        now[0] = i * idle_timeout / open_sessions
+        manager.open(f"{i:08d}")
+
+    now[0] = idle_timeout + 0.5
+    start = time.perf_counter()
+    expired = len(manager.expire())
+    tick = time.perf_counter() - start
+
+    start = time.perf_counter()
+    manager.expire()
+    idle_pass = time.perf_counter() - start
+    return len(manager) + expired, expired, tick, idle_pass
+
+
+if __name__ == "__main__":
+    total, expired, tick, idle_pass = benchmark()
+    print(f"{total} open sessions: expired {expired} in {tick * 1e6:.0f} us "
+          f"({tick / max(expired, 1) * 1e6:.2f} us each); "
+          f"pass with nothing due took {idle_pass * 1e6:.1f} us")
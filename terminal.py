@@ -0,0 +1,158 @@
+from concurrent.futures import ThreadPoolExecutor
+import time
+
+
+def default_atm():
+    """Build an ATM with the default account file"""
+    # Imported here so a GUI can draw its first screen before the account modules load
+    from atm import ATM
+    return ATM()
+
+
+class TerminalDriver:
+    """Run ATM operations on a background worker so callers never block on disk"""
+
+    def __init__(self, atm=None, factory=default_atm):
+        # A single worker keeps operations in submission order, exactly as
+        # they would run if called directly on the ATM
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="atm-worker")
+        self._atm = atm
+        self._factory = factory
+        self.loading = None
+        if atm is None:
+            self.load()
+
+    def load(self):
+        """Build the ATM on the worker, e.g. again after a failed load.
+
+        Loading never blocks the caller, and operations submitted meanwhile
+        queue up behind it.
+        """
+        self._atm = None
+        self.loading = self._executor.submit(self._factory)
+        return self.loading
+
+    @property
+    def atm(self):
+        """The ATM, waiting for a background load to finish if needed"""
+        if self._atm is None:
+            self._atm = self.loading.result()
+        return self._atm
+
+    def is_loaded(self):
+        """Check if the ATM is ready without waiting for it"""
+        return self._atm is not None or self.loading.done()
+
+    def execute(self, operation, *args):
+        """Run an ATM operation on the calling thread"""
+        return getattr(self.atm, operation)(*args)
+
+    def submit(self, operation, *args):
+        """Queue an ATM operation on the worker and return its future"""
+        return self._executor.submit(self.execute, operation, *args)
+
+    def shutdown(self, wait=True):
+        """Stop the worker thread"""
+        self._executor.shutdown(wait=wait)
+
+
+class TkTerminalDriver(TerminalDriver):
+    """Terminal driver that hands results back to Tk via root.after polling"""
+
+    def __init__(self, root, atm=None, factory=default_atm, poll_interval=20, on_error=None):
+        super().__init__(atm, factory)
+        self.root = root
+        self.poll_interval = poll_interval
+        # Called as on_error(exception) for failed operations without their own handler
+        self.on_error = on_error
+        self._pending = []
+        self._polling = False
+
+    def call(self, operation, *args, callback=None, on_error=None):
+        """Run an operation in the background and pass its result to callback on the Tk thread.
+
+        If the operation raises, the exception goes to on_error, or to the
+        driver's on_error, instead of being raised inside Tk.
+        """
+        return self._watch(self.submit(operation, *args), callback, on_error)
+
+    def when_loaded(self, callback, on_error=None):
+        """Pass the ATM to callback on the Tk thread once it has loaded"""
+        if self.loading is None:
+            callback(self.atm)
+            return
+        self._watch(self.loading, callback, on_error)
+
+    def _watch(self, future, callback, on_error=None):
+        self._pending.append((future, callback, on_error))
+        if not self._polling:
+            self._polling = True
+            self.root.after(self.poll_interval, self._poll)
+        return future
+
+    def is_busy(self):
+        """Check if any operation is still waiting for its result"""
+        return bool(self._pending)
+
+    def _poll(self):
+        """Deliver finished results and reschedule while work is outstanding"""
+        finished, pending = [], []
+        for item in self._pending:
+            (finished if item[0].done() else pending).append(item)
+        self._pending = pending
+
+        if self._pending:
+            self.root.after(self.poll_interval, self._poll)
+        else:
+            self._polling = False
+
+        for future, callback, on_error in finished:
+            try:
+                result = future.result()
+            except Exception as error:
+                handler = on_error or self.on_error
+                if handler:
+                    handler(error)
+                else:
+                    self.root.report_callback_exception(type(error), error, error.__traceback__)
+                continue
+            if callback:
+                callback(result)
+
+
+class ScriptedDriver(TerminalDriver):
+    """Headless driver that replays scripted terminal sessions without a display"""
+
+    def run(self, script):
+        """Run a list of (operation, *args) steps and return their results"""
+        return [self.execute(operation, *args) for operation, *args in script]
+
+    def run_sessions(self, sessions):
+        """Run many scripted sessions and return (results, sessions per second)"""
+        start = time.perf_counter()
+        results = [self.run(script) for script in sessions]
+        elapsed = time.perf_counter() - start
+        rate = len(sessions) / elapsed if elapsed > 0 else float('inf')
+        return results, rate
+
+
+def sample_session(full_account, pin, amount=10.0):
+    """Build a typical customer session script"""
+    return [
+        ("login", full_account, pin),
+        ("check_balance",),
+        ("deposit", amount),
+        ("withdraw", amount),
+        ("get_transaction_history",),
+        ("logout",),
+    ]
+
+
+if __name__ == "__main__":
+    from atm import ATM
+
+    driver = ScriptedDriver(ATM(accounts_file=None))
+    sessions = [sample_session("10001234", "1234")] * 5000
+    results, rate = driver.run_sessions(sessions)
+    print(f"Ran {len(results)} headless sessions at {rate:,.0f} sessions/sec")
+    driver.shutdown()